@@ -0,0 +1,592 @@
+"""
+Benchmarks of the processing pipeline
+"""
+from argparse import ArgumentParser
+import time
+import numpy as np
+import torch
+from other.deep_avsr.audio_visual.config import args
+from other.deep_avsr.audio_visual.utils.decoders import ctc_search_decode
+from other.deep_avsr.audio_only.models.audio_net import AudioNet
+from other.deep_avsr.video_only.models.video_net import VideoNet
+from other.deep_avsr.audio_visual.models.av_net import AVNet
+
+
+# previous implementation of ctc_search_decode, kept as the reference for the benchmark
+
+
+class BeamEntry:
+    """
+    Class for a single entry in the beam.
+    """
+    def __init__(self):
+        self.logPrTotal = -np.inf
+        self.logPrNonBlank = -np.inf
+        self.logPrBlank = -np.inf
+        self.logPrText = 0
+        self.lmApplied = False
+        self.lmState = None
+        self.labeling = tuple()
+
+
+class BeamState:
+
+    """
+    Class for the beam.
+    """
+
+    def __init__(self, alpha, beta):
+        self.entries = dict()
+        self.alpha = alpha
+        self.beta = beta
+
+
+    def score(self, entry):
+        """
+        Function to compute score of each entry in the beam.
+        """
+        labelingLen = len(entry.labeling)
+        if labelingLen == 0:
+            score = entry.logPrTotal + self.alpha*entry.logPrText
+        else:
+            score = (entry.logPrTotal + self.alpha*entry.logPrText)/(labelingLen**self.beta)
+        return score
+
+
+    def sort(self):
+        """
+        Function to sort all the beam entries in descending order depending on their scores.
+        """
+        beams = [entry for (key, entry) in self.entries.items()]
+        sortedBeams = sorted(beams, reverse=True, key=self.score)
+        return [x.labeling for x in sortedBeams]
+
+
+def apply_lm(parentBeam, childBeam, spaceIx, lm):
+
+    """
+    Applying the language model to obtain the language model character probabilities at a time step
+    given all the previous characters.
+    """
+
+    if not (childBeam.lmApplied):
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        if parentBeam.lmState == None:
+            initStateBatch = None
+            inputBatch = torch.tensor(spaceIx-1).reshape(1,1)
+            inputBatch = inputBatch.to(device)
+        else:
+            initStateBatch = parentBeam.lmState
+            inputBatch = torch.tensor(parentBeam.labeling[-1]-1).reshape(1,1)
+            inputBatch = inputBatch.to(device)
+        lm.eval()
+        with torch.no_grad():
+            outputBatch, finalStateBatch = lm(inputBatch, initStateBatch)
+        logProbs = outputBatch.squeeze()
+        logProb = logProbs[childBeam.labeling[-1]-1]
+        childBeam.logPrText = parentBeam.logPrText + logProb
+        childBeam.lmApplied = True
+        childBeam.lmState = finalStateBatch
+    return
+
+
+def add_beam(beamState, labeling):
+    """
+    Function to add a new entry to the beam.
+    """
+    if labeling not in beamState.entries.keys():
+        beamState.entries[labeling] = BeamEntry()
+
+
+def log_add(a, b):
+    """
+    Addition of log probabilities.
+    """
+    result = np.log(np.exp(a) + np.exp(b))
+    return result
+
+
+def legacy_ctc_search_decode(outputBatch, inputLenBatch, beamSearchParams, spaceIx, eosIx, lm, blank=0):
+
+    """
+    Applies the CTC beam search decoding along with a character-level language model.
+    Note: The probability assigned to <EOS> token is added to the probability of the blank token before decoding
+    to avoid <EOS> predictions in middle of transcriptions. Once decoded, <EOS> token is appended at last to the
+    predictions for uniformity with targets.
+    """
+
+    outputBatch = outputBatch.cpu()
+    inputLenBatch = inputLenBatch.cpu()
+    outputBatch[:,:,blank] = torch.log(torch.exp(outputBatch[:,:,blank]) + torch.exp(outputBatch[:,:,eosIx]))
+    reqIxs = np.arange(outputBatch.shape[2])
+    reqIxs = reqIxs[reqIxs != eosIx]
+    outputBatch = outputBatch[:,:,reqIxs]
+
+    beamWidth = beamSearchParams["beamWidth"]
+    alpha = beamSearchParams["alpha"]
+    beta = beamSearchParams["beta"]
+    threshProb = beamSearchParams["threshProb"]
+
+    outLogProbs = outputBatch.transpose(0, 1).numpy()
+    inpLens = inputLenBatch.numpy()
+    preds = list()
+    predLens = list()
+
+    for n in range(len(outLogProbs)):
+        mat = outLogProbs[n]
+        ilen = inpLens[n]
+        mat = mat[:ilen,:]
+        maxT, maxC = mat.shape
+
+        #initializing the main beam with a single entry having empty prediction
+        last = BeamState(alpha, beta)
+        labeling = tuple()
+        last.entries[labeling] = BeamEntry()
+        last.entries[labeling].logPrBlank = 0
+        last.entries[labeling].logPrTotal = 0
+
+        #going over all the time steps
+        for t in range(maxT):
+
+            #a temporary beam to store all possible predictions (which are extensions of predictions
+            #in the main beam after time step t-1) after time step t
+            curr = BeamState(alpha, beta)
+            #considering only the characters with probability above a certain threshold to speeden up the algo
+            prunedChars = np.where(mat[t,:] > np.log(threshProb))[0]
+
+            #keeping only the best predictions in the main beam
+            bestLabelings = last.sort()[:beamWidth]
+
+            #going over all the best predictions
+            for labeling in bestLabelings:
+
+                #same prediction (either blank or last character repeated)
+                if len(labeling) != 0:
+                    logPrNonBlank = last.entries[labeling].logPrNonBlank + mat[t, labeling[-1]]
+                else:
+                    logPrNonBlank = -np.inf
+
+                logPrBlank = last.entries[labeling].logPrTotal + mat[t, blank]
+
+                add_beam(curr, labeling)
+                curr.entries[labeling].labeling = labeling
+                curr.entries[labeling].logPrNonBlank = log_add(curr.entries[labeling].logPrNonBlank, logPrNonBlank)
+                curr.entries[labeling].logPrBlank = log_add(curr.entries[labeling].logPrBlank, logPrBlank)
+                curr.entries[labeling].logPrTotal = log_add(curr.entries[labeling].logPrTotal, log_add(logPrBlank, logPrNonBlank))
+                curr.entries[labeling].logPrText = last.entries[labeling].logPrText
+                curr.entries[labeling].lmApplied = True
+                curr.entries[labeling].lmState = last.entries[labeling].lmState
+
+
+                #extending the best prediction with all characters in the pruned set
+                for c in prunedChars:
+
+                    if c == blank:
+                        continue
+
+                    #extended prediction
+                    newLabeling = labeling + (c,)
+
+                    if (len(labeling) != 0)  and (labeling[-1] == c):
+                        logPrNonBlank = mat[t, c] + last.entries[labeling].logPrBlank
+                    else:
+                        logPrNonBlank = mat[t, c] + last.entries[labeling].logPrTotal
+
+                    add_beam(curr, newLabeling)
+                    curr.entries[newLabeling].labeling = newLabeling
+                    curr.entries[newLabeling].logPrNonBlank = log_add(curr.entries[newLabeling].logPrNonBlank, logPrNonBlank)
+                    curr.entries[newLabeling].logPrTotal = log_add(curr.entries[newLabeling].logPrTotal, logPrNonBlank)
+
+                    #applying language model
+                    if lm is not None:
+                        apply_lm(curr.entries[labeling], curr.entries[newLabeling], spaceIx, lm)
+
+            #replacing the main beam with the temporary beam having extended predictions
+            last = curr
+
+        #output the best prediciton
+        bestLabeling = last.sort()[0]
+        bestLabeling = list(bestLabeling)
+        bestLabeling.append(eosIx)
+        preds.extend(bestLabeling)
+        predLens.append(len(bestLabeling))
+
+    predictionBatch = torch.tensor(preds).int()
+    predictionLenBatch = torch.tensor(predLens).int()
+    return predictionBatch, predictionLenBatch
+
+
+def synthetic_log_probs(length, batch_size, sharpness, seed):
+    """
+    generates random model outputs
+    :param length (int): number of time steps
+    :param batch_size (int): number of utterances
+    :param sharpness (float): scale of the logits, higher values give more peaked distributions
+    :param seed (int): random seed
+    :return (tensor, tensor): log probabilities (T, B, C), input lengths (B)
+    """
+    rng = np.random.RandomState(seed)
+    logits = rng.normal(size=(length, batch_size, args['NUM_CLASSES'])) * sharpness
+    output_batch = torch.log_softmax(torch.tensor(logits, dtype=torch.float32), dim=2)
+    input_len_batch = torch.tensor(rng.randint(length // 2, length + 1, batch_size))
+    return output_batch, input_len_batch
+
+
+def benchmark_search_decode(length=150, batch_size=8, repeats=3):
+    """
+    compares ctc_search_decode with its previous implementation (without the language model)
+    :param length (int): number of time steps of every utterance
+    :param batch_size (int): number of utterances
+    :param repeats (int): number of runs with different random outputs
+    :return (void):
+    """
+    beam_search_params = {'beamWidth': args['BEAM_WIDTH'], 'alpha': args['LM_WEIGHT_ALPHA'],
+                          'beta': args['LENGTH_PENALTY_BETA'], 'threshProb': args['THRESH_PROBABILITY']}
+    time_legacy = 0
+    time_current = 0
+    identical = True
+    for i in range(repeats):
+        output_batch, input_len_batch = synthetic_log_probs(length, batch_size, 1 + i, i)
+        start = time.perf_counter()
+        legacy = legacy_ctc_search_decode(output_batch.clone(), input_len_batch, beam_search_params,
+                                          args['CHAR_TO_INDEX'][' '], args['CHAR_TO_INDEX']['<EOS>'], None)
+        time_legacy += time.perf_counter() - start
+        start = time.perf_counter()
+        current = ctc_search_decode(output_batch.clone(), input_len_batch, beam_search_params,
+                                    args['CHAR_TO_INDEX'][' '], args['CHAR_TO_INDEX']['<EOS>'], None)
+        time_current += time.perf_counter() - start
+        identical = identical and torch.equal(legacy[0], current[0]) and torch.equal(legacy[1], current[1])
+    print(f'ctc_search_decode, {repeats} x {batch_size} utterances of {length} steps, '
+          f'beam width {args["BEAM_WIDTH"]}')
+    print(f'previous: {time_legacy:.3f} s')
+    print(f'current: {time_current:.3f} s ({time_legacy / time_current:.1f}x)')
+    print(f'identical output: {identical}')
+
+
+
+def legacy_detect_silence(audio):
+    """
+    previous silence detection of utils.get_chunk_times_audio (pydub)
+    :param audio (AudioSegment): audio
+    :return list(list(float, float)): silent regions in seconds
+    """
+    from pydub import silence
+    from utils import params
+    silence_time = silence.detect_silence(audio, min_silence_len=params['MIN_SILENCE_LEN'],
+                                          silence_thresh=audio.dBFS + params['SILENCE_THRESHOLD'])
+    return [[(start / 1000), (stop / 1000)] for start, stop in silence_time]  # ms to seconds
+
+
+def legacy_get_chunk_times_audio(audio):
+    """
+    previous implementation of utils.get_chunk_times_audio (pydub silence detection)
+    :param audio (np.ndarray): mono int16 samples at AUDIO_SAMPLE_RATE
+    :return list(list(list(float, float))): chunks
+    """
+    from pydub import AudioSegment
+    from utils import params
+    audio = AudioSegment(audio.tobytes(), sample_width=2, frame_rate=params['AUDIO_SAMPLE_RATE'], channels=1)
+    duration = audio.duration_seconds
+    if duration > params['MIN_SPLIT_LEN']:
+        silence_chunks = legacy_detect_silence(audio)
+        chunks_without_silence = []
+        current_time = 0
+        for start, stop in silence_chunks:
+            if start - current_time >= 1:
+                chunks_without_silence.append([current_time, start + params['SILENCE_BUFFER']])
+            current_time = stop - params['SILENCE_BUFFER']
+        if duration - current_time >= 1:
+            chunks_without_silence.append([current_time, duration])
+        processed_chunks = []
+        current_chunk = 0
+        chunk_start = None
+        chunk = []
+        for start, stop in chunks_without_silence:
+            while stop - start != 0:
+                if chunk_start is None:
+                    chunk_start = start
+                if current_chunk + (stop - start) > params['MIN_SPLIT_LEN']:
+                    if len(chunk) == 0:
+                        processed_chunks.append(
+                            [[chunk_start, chunk_start + current_chunk + (params['MIN_SPLIT_LEN'] - current_chunk)]])
+                    else:
+                        chunk.append([chunk_start, chunk_start + (params['MIN_SPLIT_LEN'] - current_chunk)])
+                        processed_chunks.append(chunk)
+                        chunk = []
+                    start += (params['MIN_SPLIT_LEN'] - current_chunk)
+                    chunk_start = None
+                    current_chunk = 0
+                else:
+                    current_chunk += (stop - start)
+                    start = stop
+            if current_chunk != 0:
+                chunk.append([chunk_start, chunk_start + current_chunk])
+            chunk_start = None
+        if len(chunk) != 0:
+            processed_chunks.append(chunk)
+    else:
+        processed_chunks = [[[0, duration]]]
+    return processed_chunks
+
+
+def synthetic_speech(duration, seed):
+    """
+    generates audio of noise bursts separated by pauses of background noise
+    :param duration (float): duration in seconds
+    :param seed (int): random seed
+    :return (np.ndarray): mono int16 samples at 16 kHz
+    """
+    rng = np.random.RandomState(seed)
+    rate = 16000
+    parts = []
+    length = 0
+    while length < duration * rate:
+        speech = rng.normal(scale=rng.uniform(2000, 8000), size=int(rng.uniform(0.5, 8) * rate))
+        pause = rng.normal(scale=30, size=int(rng.uniform(0.2, 3) * rate))
+        parts.extend([speech, pause])
+        length += len(speech) + len(pause)
+    audio = np.concatenate(parts)[:int(duration * rate)]
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+
+def benchmark_split(duration=600):
+    """
+    compares utils.get_chunk_times_audio with its previous implementation
+    :param duration (float): duration of the synthetic audio in seconds
+    :return (void):
+    """
+    from pydub import AudioSegment
+    from utils import get_chunk_times_audio, detect_silence, params
+    audio = synthetic_speech(duration, 0)
+    start = time.perf_counter()
+    legacy = legacy_get_chunk_times_audio(audio)
+    time_legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    current = get_chunk_times_audio(audio)
+    time_current = time.perf_counter() - start
+    current = [[list(interval) for interval in chunk] for chunk in current]
+    print(f'get_chunk_times_audio, {duration} s of audio')
+    print(f'previous: {time_legacy:.3f} s, {len(legacy)} chunks')
+    print(f'current: {time_current:.3f} s ({time_legacy / time_current:.1f}x), {len(current)} chunks')
+
+    # the silences must match up to the quantization of both detections: 10 ms frames against 1 ms steps over
+    # MIN_SILENCE_LEN windows, which can put an edge one frame apart in either direction
+    tolerance = 2 * params['VAD_FRAME_LEN']
+    legacy_silence = legacy_detect_silence(AudioSegment(audio.tobytes(), sample_width=2,
+                                                        frame_rate=params['AUDIO_SAMPLE_RATE'], channels=1))
+    current_silence = detect_silence(audio)
+    same_silence = len(legacy_silence) == len(current_silence) and (
+        len(current_silence) == 0 or np.abs(np.array(legacy_silence) - np.array(current_silence)).max() <= tolerance)
+    print(f'silent regions: previous {len(legacy_silence)}, current {len(current_silence)}, '
+          f'identical up to {tolerance * 1000:.0f} ms: {same_silence}')
+
+    # the chunk boundaries also differ where the previous planner closed a non-first piece of a chunk at the chunk
+    # start plus the cumulative chunk length
+    different = [i for i in range(max(len(legacy), len(current)))
+                 if i >= len(legacy) or i >= len(current) or len(legacy[i]) != len(current[i])
+                 or np.abs(np.array(legacy[i]) - np.array(current[i])).max() > tolerance]
+    print(f'chunks with different boundaries: {len(different)}')
+    for i in different:
+        print(f'chunk {i}: previous {legacy[i] if i < len(legacy) else None}, '
+              f'current {current[i] if i < len(current) else None}')
+
+
+def synthetic_model_inputs(mode, lengths, seed):
+    """
+    generates random model inputs
+    :param mode (str): prediction mode
+    :param lengths (list(int)): sample lengths in output frames
+    :param seed (int): random seed
+    :return list(tensor or tuple): input of every sample, (T, 1, features) like the front ends prepare them
+    """
+    rng = np.random.RandomState(seed)
+    inputs = []
+    for length in lengths:
+        audio = torch.tensor(rng.normal(size=(4 * length, 1, args['AUDIO_FEATURE_SIZE'])), dtype=torch.float32)
+        video = torch.tensor(rng.normal(size=(length, 1, args['TX_NUM_FEATURES'])), dtype=torch.float32)
+        if mode == 'audio-only':
+            inputs.append(audio)
+        elif mode == 'video-only':
+            inputs.append(video)
+        else:
+            inputs.append((audio, video))
+    return inputs
+
+
+def pad_batch(mode, inputs, lengths):
+    """
+    pads model inputs into a batch like the front ends collate them
+    :param mode (str): prediction mode
+    :param inputs (list(tensor or tuple)): input of every sample (synthetic_model_inputs output)
+    :param lengths (list(int)): sample lengths in output frames
+    :return (tensor or tuple): input batch
+    """
+    if mode == 'audio-video':
+        return (torch.cat([torch.nn.functional.pad(inp[0], (0, 0, 0, 0, 0, 4 * (max(lengths) - length)))
+                           for inp, length in zip(inputs, lengths)], dim=1),
+                torch.cat([torch.nn.functional.pad(inp[1], (0, 0, 0, 0, 0, max(lengths) - length))
+                           for inp, length in zip(inputs, lengths)], dim=1))
+    scale = 4 if mode == 'audio-only' else 1
+    return torch.cat([torch.nn.functional.pad(inp, (0, 0, 0, 0, 0, scale * (max(lengths) - length)))
+                      for inp, length in zip(inputs, lengths)], dim=1)
+
+
+def benchmark_batching(duration=60, repeats=3):
+    """
+    compares the models run on CPU on every chunk alone with the models run on the batches the engine makes with the
+    default settings, the chunks are those the planner cuts from synthetic speech
+    :param duration (float): duration of the synthetic audio in seconds
+    :param repeats (int): number of timed runs, the median is reported
+    :return (void):
+    """
+    from utils import get_chunk_times_audio, params
+    from other.deep_avsr.batching import make_batches
+    audio = synthetic_speech(duration, 0)
+    lengths = [max(int(round(sum(stop - start for start, stop in chunk) * params['VIDEO_FPS'])), 1)
+               for chunk in get_chunk_times_audio(audio)]
+    batches = make_batches(lengths, args['INFERENCE_CPU_BATCH_SIZE'], args['INFERENCE_PADDING_BUDGET'])
+    models = {
+        'audio-only': AudioNet(args['TX_NUM_FEATURES'], args['TX_ATTENTION_HEADS'], args['TX_NUM_LAYERS'],
+                               args['PE_MAX_LENGTH'], args['AUDIO_FEATURE_SIZE'], args['TX_FEEDFORWARD_DIM'],
+                               args['TX_DROPOUT'], args['NUM_CLASSES']),
+        'video-only': VideoNet(args['TX_NUM_FEATURES'], args['TX_ATTENTION_HEADS'], args['TX_NUM_LAYERS'],
+                               args['PE_MAX_LENGTH'], args['TX_FEEDFORWARD_DIM'], args['TX_DROPOUT'],
+                               args['NUM_CLASSES']),
+        'audio-video': AVNet(args['TX_NUM_FEATURES'], args['TX_ATTENTION_HEADS'], args['TX_NUM_LAYERS'],
+                             args['PE_MAX_LENGTH'], args['AUDIO_FEATURE_SIZE'], args['TX_FEEDFORWARD_DIM'],
+                             args['TX_DROPOUT'], args['NUM_CLASSES'])
+    }
+    torch.manual_seed(0)
+    print(f'{len(lengths)} chunks of {sorted(lengths, reverse=True)} frames, batches of {[len(b) for b in batches]}')
+    for mode, model in models.items():
+        model.eval()
+        inputs = synthetic_model_inputs(mode, lengths, 0)
+        batch_inputs = [(batch, pad_batch(mode, [inputs[i] for i in batch], [lengths[i] for i in batch]))
+                        for batch in batches]
+        times_alone = []
+        times_batched = []
+        with torch.no_grad():
+            # the first call allocates the buffers of the model, it is not timed
+            model(inputs[0])
+            for _ in range(repeats):
+                start = time.perf_counter()
+                alone = [model(inp)[:, 0] for inp in inputs]
+                times_alone.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                batched = [(batch, model(input_batch, torch.tensor([lengths[i] for i in batch])))
+                           for batch, input_batch in batch_inputs]
+                times_batched.append(time.perf_counter() - start)
+        difference = max(float((output[:lengths[i], j] - alone[i]).abs().max())
+                         for batch, output in batched for j, i in enumerate(batch))
+        same_labels = all(torch.equal(output[:lengths[i], j].argmax(dim=1), alone[i].argmax(dim=1))
+                          for batch, output in batched for j, i in enumerate(batch))
+        time_alone = np.median(times_alone)
+        time_batched = np.median(times_batched)
+        print(mode)
+        print(f'alone: {time_alone:.3f} s, batched: {time_batched:.3f} s ({time_alone / time_batched:.2f}x)')
+        print(f'max log probability difference: {difference:.2e}, same most probable characters: {same_labels}')
+
+
+def benchmark_streaming_stft(duration=60, seed=0):
+    """
+    compares the features of the audio streamed in random blocks, some of them empty or shorter than an STFT window,
+    with the offline features of the whole audio
+    the streamed features are normalised with the running power, they are rescaled to the power of the whole audio
+    :param duration (float): duration of the synthetic audio in seconds
+    :param seed (int): random seed
+    :return (void):
+    """
+    from other.deep_avsr.audio_only.data.utils import prepare_main_input, StreamingSTFT
+    audio_params = {'stftWindow': args['STFT_WINDOW'], 'stftWinLen': args['STFT_WIN_LENGTH'],
+                    'stftOverlap': args['STFT_OVERLAP']}
+    audio = synthetic_speech(duration, seed)
+    rng = np.random.RandomState(seed)
+    stft = StreamingSTFT(16000, audio_params)
+    blocks = []
+    position = 0
+    start = time.perf_counter()
+    while position < len(audio):
+        size = rng.choice([0, rng.randint(1, stft.winLen), rng.randint(stft.winLen, 16000)])
+        features = stft.process(audio[position:position + size])
+        blocks.append(features * np.sqrt(stft.sumSquares / max(stft.numSamples, 1)))
+        position += size
+    time_streamed = time.perf_counter() - start
+    streamed = np.concatenate(blocks) / np.sqrt(stft.sumSquares / stft.numSamples)
+    start = time.perf_counter()
+    offline, _, _, _ = prepare_main_input((16000, audio), None, None, 0, None, None, audio_params)
+    time_offline = time.perf_counter() - start
+    # removing the zero vectors padding the offline features to a multiple of 4
+    offline = offline.numpy()
+    padding = len(offline) - len(streamed)
+    offline = offline[padding // 2:len(offline) - (padding - padding // 2)]
+    print(f'STFT features, {duration} s of audio in {len(blocks)} blocks')
+    print(f'offline: {time_offline:.3f} s, {len(offline)} vectors')
+    print(f'streamed: {time_streamed:.3f} s, {len(streamed)} vectors')
+    if len(offline) == len(streamed):
+        print(f'max difference: {np.abs(offline - streamed).max():.2e}, max feature: {np.abs(offline).max():.2e}')
+
+
+def legacy_read_roi_frames(video_file, roi_size):
+    """
+    previous mouth ROI reading of the preprocessing (OpenCV decoding and resizing)
+    :param video_file (str): video filepath
+    :param roi_size (int): ROI size
+    :return (np.ndarray): float frames in [0, 1] (frames, ROI size, ROI size)
+    """
+    import cv2 as cv
+    capture = cv.VideoCapture(video_file)
+    roi_sequence = []
+    while capture.isOpened():
+        ret, frame = capture.read()
+        if not ret:
+            break
+        grayed = cv.cvtColor(frame, cv.COLOR_BGR2GRAY) / 255
+        grayed = cv.resize(grayed, (224, 224))
+        roi_sequence.append(grayed[int(112 - roi_size / 2):int(112 + roi_size / 2),
+                                   int(112 - roi_size / 2):int(112 + roi_size / 2)])
+    capture.release()
+    return np.stack(roi_sequence, axis=0)
+
+
+def benchmark_roi(video_file):
+    """
+    compares the mouth ROI frames read through the ffmpeg pipe with the previous OpenCV reading
+    :param video_file (str): video filepath
+    :return (void):
+    """
+    from other.deep_avsr.audio_visual.utils.preprocessing import read_roi_frames
+    start = time.perf_counter()
+    legacy = legacy_read_roi_frames(video_file, args['ROI_SIZE'])
+    time_legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    current = read_roi_frames(video_file, args['ROI_SIZE']).astype(np.float64) / 255
+    time_current = time.perf_counter() - start
+    print(f'mouth ROI frames of {video_file}')
+    print(f'previous: {time_legacy:.3f} s, {len(legacy)} frames')
+    print(f'current: {time_current:.3f} s ({time_legacy / time_current:.1f}x), {len(current)} frames')
+    if len(legacy) == len(current):
+        difference = np.abs(legacy - current) * 255
+        print(f'difference in grey levels: max {difference.max():.2f}, mean {difference.mean():.2f}')
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('benchmark', type=str, choices=['decoder', 'split', 'batching', 'roi', 'stft'], help='benchmark to run')
+    parser.add_argument('-n', type=int, default=3, help='number of repeats')
+    parser.add_argument('-d', type=float, default=600, help='audio duration in seconds')
+    parser.add_argument('-f', type=str, help='video filepath')
+    args = parser.parse_args()
+    if args.benchmark == 'decoder':
+        benchmark_search_decode(repeats=args.n)
+    elif args.benchmark == 'split':
+        benchmark_split(args.d)
+    elif args.benchmark == 'batching':
+        benchmark_batching(repeats=args.n)
+    elif args.benchmark == 'roi':
+        benchmark_roi(args.f)
+    elif args.benchmark == 'stft':
+        benchmark_streaming_stft(args.d)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,9 +10,9 @@ from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 from PyQt5.QtMultimediaWidgets import QVideoWidget
 import pyqtgraph as pg
 from ui_utils import ms_to_time, resize_font, clear_widget
-from utils import check_streams, get_from_file, change_config_file, change_file
+from utils import check_streams, get_from_file, get_inference_config, change_file
 from responsive_svg import SvgWidgetAspect, ResponsiveIconButton
-from result_processing import ResultWidget, ResultProcess, LoadingScreen
+from result_processing import ResultWidget, LoadingScreen
 import os
 import numpy as np
 from scipy.io import wavfile
@@ -304,13 +304,6 @@ class ProcessWidget(QWidget):
         self.process_button.clicked.connect(self.process)
         self.button_area_layout.addWidget(self.process_button, alignment=Qt.AlignCenter)
         self.button_area.setLayout(self.button_area_layout)
-        self.result = {
-            'audio-only': None,
-            'video-only': None,
-            'audio-video': None
-        }
-        self.threads = []
-        self.workers = []
         files = [os.path.abspath(file) for file in files]
         if not self.file_type == 'audio':
             self.check_files(files)
@@ -362,7 +355,6 @@ class ProcessWidget(QWidget):
         if parent.screen_widgets['file_upload_widget']:
             parent.screen_widgets['file_upload_widget'].setVisible(False)
         self.setVisible(False)
-        parent.render_loading_screen()
         config = get_from_file('config.txt', '')
         if self.file_type != 'audio':
             if self.radio_button_preferred.isChecked():
@@ -370,51 +362,24 @@ class ProcessWidget(QWidget):
                              [self.audio_video, 'audio-video']]
             elif self.radio_button_audio_only.isChecked():
                 raw_files = [[self.audio_only + self.audio_video, 'audio-only']]
-                self.result['video-only'] = []
-                self.result['audio-video'] = []
             elif self.radio_button_video_only.isChecked():
                 raw_files = [[self.video_only + self.audio_video, 'video-only']]
-                self.result['audio-only'] = []
-                self.result['audio-video'] = []
             else:
                 raw_files = [[self.audio_video, 'audio-video']]
-                self.result['audio-only'] = []
-                self.result['video-only'] = []
         else:
             raw_files = [[self.audio_only, 'audio-only']]
-            self.result['video-only'] = []
-            self.result['audio-video'] = []
+        # the result screen is shown right away and filled in as the files are transcribed
+        result = dict()
+        for files, mode in raw_files:
+            for file in files:
+                result[file] = [mode, None]
+        result_widget = parent.render_result_process(result)
         for files, mode in raw_files:
             if len(files) > 0:
                 data = get_from_file('data.txt', '')
                 param = mode[0].upper() + mode[1:] + ' used'
                 change_file('data.txt', param, int(data[param]) + len(files))
-                for param, param_val in [['TEST_DEMO_DECODING', config['Decoder']],
-                                         ['TEST_DEMO_NOISY', config['Use noise']],
-                                         ['USE_LM', config['Use LM']], ['NOISE_SNR_DB', int(config['Audio SNR'])]]:
-                    change_config_file(mode, param, param_val)
-                thread = parent.create_thread()
-                worker = ResultProcess(files, mode, int(config['Video SNR']))
-                worker.moveToThread(thread)
-                thread.started.connect(worker.process)
-                worker.finished.connect(self.process_result)
-                thread.start()
-                self.threads.append(thread)
-                self.workers.append(worker)
-            else:
-                self.result[mode] = []
-
-    def process_result(self, result, mode):
-        self.result[mode] = result
-        if self.result['audio-only'] is not None and self.result['video-only'] is not None and self.result[
-            'audio-video'] is not None:
-            result = dict()
-            for mode, res in self.result.items():
-                if len(res) != 0:
-                    for key, val in res.items():
-                        res[key] = [mode, val]
-                result.update(res)
-            self.parent().parent().render_result_process(result)
+                result_widget.start(files, get_inference_config(mode, config))
 
     def resizeEvent(self, e):
         self.area.setGeometry(0, 0, self.width(), self.height())
@@ -79,10 +79,17 @@ args["LM_WEIGHT_ALPHA"] = 0.5  # weight of language model probability in shallow
 args["LENGTH_PENALTY_BETA"] = 0.1  # length penalty exponent hyperparameter
 args["THRESH_PROBABILITY"] = 0.0001  # threshold probability in beam search algorithm
 args['USE_LM'] = 'False'  # whether to use language model for decoding
+args["LM_CACHE_SIZE"] = 2048  # number of labelings whose language model states are cached during beam search
 
 # testing
 args['TEST_DEMO_DECODING'] = 'greedy'  # test/demo decoding type - "greedy" or "search"
 args['TEST_DEMO_NOISY'] = 'False'  # test/demo with noisy audio
+args["INFERENCE_BATCH_SIZE"] = 8  # maximum number of chunks in one inference batch on GPU
+args["INFERENCE_CPU_BATCH_SIZE"] = 4  # maximum number of chunks in one inference batch on CPU
+args["INFERENCE_PADDING_BUDGET"] = 0.25  # maximum fraction of padding frames in one inference batch
+args["PROFILE_INFERENCE"] = False  # whether to print the time spent in every inference stage
+args["LIVE_WINDOW"] = 4.0  # window size in secs for live transcription
+args["LIVE_HOP"] = 1.0  # step in secs between consecutive live transcription windows
 
 if __name__ == "__main__":
 
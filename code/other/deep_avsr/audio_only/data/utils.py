@@ -18,6 +18,7 @@ def prepare_main_input(audioFile, targetFile, noise, reqInpLen, charToIx, noiseS
 
     """
     Function to convert the data sample (audio file, target file) in the main dataset into appropriate tensors.
+    The audio can also be given directly as a (sampling rate, samples) tuple.
     """
 
     if targetFile is not None:
@@ -41,7 +42,10 @@ def prepare_main_input(audioFile, targetFile, noise, reqInpLen, charToIx, noiseS
     stftWindow = audioParams["stftWindow"]
     stftWinLen = audioParams["stftWinLen"]
     stftOverlap = audioParams["stftOverlap"]
-    sampFreq, inputAudio = wavfile.read(audioFile)
+    if isinstance(audioFile, str):
+        sampFreq, inputAudio = wavfile.read(audioFile)
+    else:
+        sampFreq, inputAudio = audioFile
 
     #pad the audio to get atleast 4 STFT vectors
     if len(inputAudio) < sampFreq*(stftWinLen + 3*(stftWinLen - stftOverlap)):
@@ -97,6 +101,62 @@ def prepare_main_input(audioFile, targetFile, noise, reqInpLen, charToIx, noiseS
 
 
 
+class StreamingSTFT:
+
+    """
+    Class for extracting the STFT features of prepare_main_input from audio arriving in blocks.
+    Every 321-dim magnitude vector is emitted as soon as its window of samples is complete, the samples of the
+    incomplete windows are kept between the blocks (overlap-save), so the vectors are the same as those of the STFT of
+    the whole audio. prepare_main_input scales the audio to unit power, which only scales the magnitudes, so the vectors
+    are divided by the RMS of all the samples seen so far instead; they match the offline features once the running
+    power has settled.
+    """
+
+    def __init__(self, sampFreq, audioParams):
+        self.winLen = int(round(sampFreq*audioParams["stftWinLen"]))
+        self.hop = self.winLen - int(round(sampFreq*audioParams["stftOverlap"]))
+        self.window = signal.get_window(audioParams["stftWindow"], self.winLen)
+        #scipy scales the STFT by the window sum (spectrum scaling)
+        self.window = self.window/np.sum(self.window)
+        self.tail = np.zeros(0)
+        self.sumSquares = 0.0
+        self.numSamples = 0
+
+
+    def process(self, samples):
+        """
+        Function to add a block of samples and get the (numVectors, 321) features of the windows it completes.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        self.sumSquares = self.sumSquares + np.sum(samples**2)
+        self.numSamples = self.numSamples + len(samples)
+
+        buffer = np.concatenate([self.tail, samples])
+        numVectors = max((len(buffer) - self.winLen)//self.hop + 1, 0)
+        #keeping the samples until they complete a window
+        if numVectors == 0:
+            self.tail = buffer
+            return np.zeros((0, self.winLen//2 + 1), dtype=np.float32)
+        frames = np.lib.stride_tricks.as_strided(buffer, (numVectors, self.winLen),
+                                                 (self.hop*buffer.strides[0], buffer.strides[0]), writeable=False)
+        self.tail = buffer[numVectors*self.hop:]
+        out = np.abs(np.fft.rfft(frames*self.window, axis=1))
+
+        #normalising with the running power instead of the power of the whole audio
+        if self.sumSquares > 0:
+            out = out/np.sqrt(self.sumSquares/self.numSamples)
+        return out.astype(np.float32)
+
+
+    def reset(self):
+        """
+        Function to restart the stream after a gap in the samples, the normalisation statistics are kept.
+        """
+        self.tail = np.zeros(0)
+        return
+
+
+
 def prepare_pretrain_input(audioFile, targetFile, noise, numWords, charToIx, noiseSNR, audioParams):
 
     """
@@ -61,15 +61,26 @@ class AudioNet(nn.Module):
         return
 
 
-    def forward(self, inputBatch):
+    def forward(self, inputBatch, inputLenBatch=None):
         inputBatch = inputBatch.transpose(0, 1).transpose(1, 2)
         batch = self.audioConv(inputBatch)
         batch = batch.transpose(1, 2).transpose(0, 1)
+        paddingMask = self.padding_mask(batch, inputLenBatch)
         batch = self.positionalEncoding(batch)
-        batch = self.audioEncoder(batch)
-        batch = self.audioDecoder(batch)
+        batch = self.audioEncoder(batch, src_key_padding_mask=paddingMask)
+        batch = self.audioDecoder(batch, src_key_padding_mask=paddingMask)
         batch = batch.transpose(0, 1).transpose(1, 2)
         batch = self.outputConv(batch)
         batch = batch.transpose(1, 2).transpose(0, 1)
         outputBatch = F.log_softmax(batch, dim=2)
         return outputBatch
+
+
+    def padding_mask(self, batch, inputLenBatch):
+        """
+        Function to mask the padding of the shorter samples in the batch, so that every sample is transcribed as if it
+        was alone.
+        """
+        if inputLenBatch is None:
+            return None
+        return torch.arange(batch.shape[0], device=batch.device).unsqueeze(0) >= inputLenBatch.to(batch.device).unsqueeze(1)
@@ -38,8 +38,8 @@ def main():
     print("\n\nStarting preprocessing ....\n")
 
     for file in tqdm(filesList, leave=True, desc="Preprocess", ncols=75):
-        file_output = args['PRED_OUTPUT'] + 'temp.wav'
-        preprocess_sample(file, file_output)
+        sampFreq, audio = preprocess_sample(file + ".mp4")
+        wavfile.write(file + ".wav", sampFreq, audio)
     print(filesList)
     exit()
 
@@ -1,101 +1,57 @@
-import torch
-import numpy as np
-import os
-
-from scipy.io import wavfile
-
 from .models.audio_net import AudioNet
-from .models.lrs2_char_lm import LRS2CharLM
 from .data.utils import prepare_main_input, collate_fn
 from .utils.preprocessing import preprocess_sample
-from .utils.decoders import ctc_greedy_decode, ctc_search_decode
 from .utils.metrics import compute_wer
+from ..inference_config import InferenceConfig
+from ..engine import ModalityFrontend, predict as run_engine
+from ..live import LiveTranscriber
 
 from argparse import ArgumentParser
 
 
-def predict(files):
-    # files {file: [filepath, filepath]}
-    from importlib import reload
-    from . import config
-    reload(config)
-    print('lm decoder noise db: ', config.args["USE_LM"], config.args["TEST_DEMO_DECODING"], config.args["TEST_DEMO_NOISY"], config.args["NOISE_SNR_DB"])
-    result = dict()
-    np.random.seed(config.args["SEED"])
-    torch.manual_seed(config.args["SEED"])
-    gpuAvailable = torch.cuda.is_available()
-    device = torch.device("cuda" if gpuAvailable else "cpu")
-
-    if config.args["TRAINED_MODEL_FILE"] is not None:
-        # declaring the model and loading the trained weights
-        model = AudioNet(config.args["TX_NUM_FEATURES"], config.args["TX_ATTENTION_HEADS"], config.args["TX_NUM_LAYERS"],
-                         config.args["PE_MAX_LENGTH"],
-                         config.args["AUDIO_FEATURE_SIZE"], config.args["TX_FEEDFORWARD_DIM"], config.args["TX_DROPOUT"],
-                         config.args["NUM_CLASSES"])
-        model.load_state_dict(torch.load(config.args["CODE_DIRECTORY"] + config.args["TRAINED_MODEL_FILE"], map_location=device))
-        model.to(device)
+class AudioFrontend(ModalityFrontend):
+    """
+    audio-only front end: the audio of a chunk is converted to STFT features
+    """
+    name = 'audio-only'
+    uses_audio = True
 
-        # declaring the language model and loading the trained weights
-        lm = LRS2CharLM()
-        lm.load_state_dict(torch.load(config.args["TRAINED_LM_FILE"], map_location=device))
-        lm.to(device)
-        if not config.args["USE_LM"]:
-            lm = None
+    def build_model(self, config):
+        return AudioNet(config.args["TX_NUM_FEATURES"], config.args["TX_ATTENTION_HEADS"], config.args["TX_NUM_LAYERS"],
+                        config.args["PE_MAX_LENGTH"], config.args["AUDIO_FEATURE_SIZE"],
+                        config.args["TX_FEEDFORWARD_DIM"], config.args["TX_DROPOUT"], config.args["NUM_CLASSES"])
 
-        # reading the noise file
-        if config.args["TEST_DEMO_NOISY"]:
-            _, noise = wavfile.read(config.args["DATA_DIRECTORY"] + "/noise.wav")
+    def prepare(self, chunk, config, noise):
+        # preprocessing the sample (a decoded chunk or a video file)
+        if isinstance(chunk, dict):
+            audio = chunk["audio"]
         else:
-            noise = None
-        # walking through the demo directory and running the model on all video files in it
-        for filepath, file_chunks in files.items():
-            result[filepath] = ''
-            for file in file_chunks:
-                if file.endswith(".mp4"):
-                    file_output = config.args['PRED_OUTPUT'] + 'temp.wav'
-                    # preprocessing the sample
-                    preprocess_sample(file, file_output)
+            audio = preprocess_sample(chunk)
 
-                    # converting the data sample into appropriate tensors for input to the model
-                    audioFile = file_output
-                    audioParams = {"stftWindow": config.args["STFT_WINDOW"], "stftWinLen": config.args["STFT_WIN_LENGTH"],
-                                   "stftOverlap": config.args["STFT_OVERLAP"]}
-                    inp, _, inpLen, _ = prepare_main_input(audioFile, None, noise, config.args["MAIN_REQ_INPUT_LENGTH"],
-                                                           config.args["CHAR_TO_INDEX"],
-                                                           config.args["NOISE_SNR_DB"], audioParams)
-                    inputBatch, _, inputLenBatch, _ = collate_fn([(inp, None, inpLen, None)])
+        # converting the data sample into appropriate tensors for input to the model
+        audioParams = {"stftWindow": config.args["STFT_WINDOW"], "stftWinLen": config.args["STFT_WIN_LENGTH"],
+                       "stftOverlap": config.args["STFT_OVERLAP"]}
+        inp, _, inpLen, _ = prepare_main_input(audio, None, noise, config.args["MAIN_REQ_INPUT_LENGTH"],
+                                               config.args["CHAR_TO_INDEX"], config.args["NOISE_SNR_DB"], audioParams)
+        return inp, None, inpLen, None
 
-                    # running the model
-                    inputBatch = (inputBatch.float()).to(device)
-                    inputLenBatch = (inputLenBatch.int()).to(device)
-                    model.eval()
-                    with torch.no_grad():
-                        outputBatch = model(inputBatch)
+    def collate(self, samples):
+        inputBatch, _, inputLenBatch, _ = collate_fn(samples)
+        return inputBatch, inputLenBatch
 
-                    # obtaining the prediction using CTC deocder
-                    if config.args["TEST_DEMO_DECODING"] == "greedy":
-                        predictionBatch, predictionLenBatch = ctc_greedy_decode(outputBatch, inputLenBatch,
-                                                                                config.args["CHAR_TO_INDEX"]["<EOS>"])
 
-                    elif config.args["TEST_DEMO_DECODING"] == "search":
-                        beamSearchParams = {"beamWidth": config.args["BEAM_WIDTH"], "alpha": config.args["LM_WEIGHT_ALPHA"],
-                                            "beta": config.args["LENGTH_PENALTY_BETA"],
-                                            "threshProb": config.args["THRESH_PROBABILITY"]}
-                        predictionBatch, predictionLenBatch = ctc_search_decode(outputBatch, inputLenBatch,
-                                                                                beamSearchParams,
-                                                                                config.args["CHAR_TO_INDEX"][" "],
-                                                                                config.args["CHAR_TO_INDEX"]["<EOS>"], lm)
+def predict(files, config=None, profiler=None, progress=None):
+    # files {file: [chunk, chunk]}, a chunk is a video filepath or a decoded chunk {'audio': ..., 'video': ...}
+    if config is None:
+        config = InferenceConfig('audio-only')
+    return run_engine(files, config, AudioFrontend(), profiler, progress)
 
-                    else:
-                        exit()
-                    # converting character indices back to characters
-                    pred = predictionBatch[:][:-1]
-                    pred = "".join([config.args["INDEX_TO_CHAR"][ix] for ix in pred.tolist()])
 
-                    if result[filepath] != '':
-                        result[filepath] += ' '
-                    result[filepath] += pred
-    return result
+def live_transcriber(config=None):
+    # transcriber of a recording in progress, fed with the samples of the stream
+    if config is None:
+        config = InferenceConfig('audio-only')
+    return LiveTranscriber(config, AudioFrontend())
 
 
 def main():
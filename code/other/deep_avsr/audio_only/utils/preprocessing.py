@@ -6,25 +6,36 @@ https://github.com/lordmartian/deep_avsr
 """
 
 import os
+import subprocess
+import numpy as np
+from scipy.io import wavfile
 
 
-def preprocess_sample(input, output):
+def extract_audio(videoFile, sampFreq=16000):
+    """
+    Function to extract the mono audio track of a video file using the FFmpeg utility.
+    The samples are streamed through a pipe as 16-bit PCM, exactly as they would be written to a wav file.
+    """
+    command = ["ffmpeg", "-v", "quiet", "-i", videoFile, "-vn", "-ac", "1", "-ar", str(sampFreq),
+               "-f", "s16le", "-acodec", "pcm_s16le", "-"]
+    audio = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
+    return sampFreq, np.frombuffer(audio, dtype=np.int16)
+
+
+def preprocess_sample(input):
     """
     Function to preprocess each data sample.
-    Extracts the audio from the video file using the FFmpeg utility and saves it to a wav file.
+    Extracts the audio from the video file and returns it as a (sampling rate, samples) tuple.
     """
-    videoFile = input
-    audioFile = output
-    v2aCommand = "ffmpeg -y -v quiet -i " + videoFile + " -ac 1 -ar 16000 -vn " + audioFile
-    os.system(v2aCommand)
-    return
+    return extract_audio(input)
 
 
 def preprocess_dir(dir_path):
     for file in os.listdir(dir_path):
         filename = dir_path + '\\' + file
         output = filename.split('.')[0] + '.wav'
-        preprocess_sample(filename, output)
+        sampFreq, audio = preprocess_sample(filename)
+        wavfile.write(output, sampFreq, audio)
 
 
 if __name__ == '__main__':
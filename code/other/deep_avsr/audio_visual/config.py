@@ -18,6 +18,7 @@ args["PRETRAINED_MODEL_FILE"] = "audio-visual.pt"  # relative path to the pretra
 args["TRAINED_MODEL_FILE"] = "audio-visual.pt"  # relative path to the trained model file
 args["TRAINED_LM_FILE"] = '\\'.join(current_dir.split('\\')[0:-2]) + '\\weights\\language_model.pt'  # absolute path to the trained language model file
 args["TRAINED_FRONTEND_FILE"] = '\\'.join(current_dir.split('\\')[0:-2]) + '\\weights\\visual_frontend.pt'  # absolute path to the trained visual frontend file
+args["DEBUG_ROI_FILE"] = None  # absolute path to save the mouth ROIs of the last processed chunk as an image, for debugging
 
 # data
 args["PRETRAIN_VAL_SPLIT"] = 0.01  # validation set size fraction during pretraining
@@ -49,6 +50,7 @@ args["STFT_OVERLAP"] = 0.030  # consecutive window overlap in secs while computi
 # video preprocessing
 args["VIDEO_FPS"] = 25  # frame rate of the video clips
 args["ROI_SIZE"] = 112  # height and width of input greyscale lip region patch
+args["VF_WINDOW_SIZE"] = 64  # number of frames passed through the visual frontend at once
 args["NORMALIZATION_MEAN"] = 0.4161  # mean value for normalization of greyscale lip region patch
 args["NORMALIZATION_STD"] = 0.1688  # standard deviation value for normalization of greyscale lip region patch
 
@@ -88,11 +90,16 @@ args["LM_WEIGHT_ALPHA"] = 0.5  # weight of language model probability in shallow
 args["LENGTH_PENALTY_BETA"] = 0.1  # length penalty exponent hyperparameter
 args["THRESH_PROBABILITY"] = 0.0001  # threshold probability in beam search algorithm
 args['USE_LM'] = 'False'  # whether to use language model for decoding
+args["LM_CACHE_SIZE"] = 2048  # number of labelings whose language model states are cached during beam search
 
 # testing
 args['TEST_DEMO_DECODING'] = 'greedy'  # test/demo decoding type - "greedy" or "search"
 args['TEST_DEMO_NOISY'] = 'False'  # test/demo with noisy audio
 args["TEST_DEMO_MODE"] = "AV"  # mode to use AV model in - "AO" or "VO" or "AV"
+args["INFERENCE_BATCH_SIZE"] = 8  # maximum number of chunks in one inference batch on GPU
+args["INFERENCE_CPU_BATCH_SIZE"] = 4  # maximum number of chunks in one inference batch on CPU
+args["INFERENCE_PADDING_BUDGET"] = 0.25  # maximum fraction of padding frames in one inference batch
+args["PROFILE_INFERENCE"] = False  # whether to print the time spent in every inference stage
 
 if __name__ == "__main__":
 
@@ -19,6 +19,7 @@ def prepare_main_input(audioFile, visualFeaturesFile, targetFile, noise, reqInpL
 
     """
     Function to convert the data sample in the main dataset into appropriate tensors.
+    The audio and the visual features can also be given directly as a (sampling rate, samples) tuple and an array.
     """
 
     if targetFile is not None:
@@ -42,7 +43,10 @@ def prepare_main_input(audioFile, visualFeaturesFile, targetFile, noise, reqInpL
     stftWindow = audioParams["stftWindow"]
     stftWinLen = audioParams["stftWinLen"]
     stftOverlap = audioParams["stftOverlap"]
-    sampFreq, inputAudio = wavfile.read(audioFile)
+    if isinstance(audioFile, str):
+        sampFreq, inputAudio = wavfile.read(audioFile)
+    else:
+        sampFreq, inputAudio = audioFile
 
     #pad the audio to get atleast 4 STFT vectors
     if len(inputAudio) < sampFreq*(stftWinLen + 3*(stftWinLen - stftOverlap)):
@@ -70,7 +74,10 @@ def prepare_main_input(audioFile, visualFeaturesFile, targetFile, noise, reqInpL
 
 
     #loading the visual features
-    vidInp = np.load(visualFeaturesFile)
+    if isinstance(visualFeaturesFile, str):
+        vidInp = np.load(visualFeaturesFile)
+    else:
+        vidInp = visualFeaturesFile
 
 
     #padding zero vectors to extend the audio and video length to a least possible integer length such that
@@ -65,21 +65,24 @@ class AVNet(nn.Module):
         return
 
 
-    def forward(self, inputBatch):
+    def forward(self, inputBatch, inputLenBatch=None):
         audioInputBatch, videoInputBatch = inputBatch
+        paddingMask = None
 
         if audioInputBatch is not None:
             audioInputBatch = audioInputBatch.transpose(0, 1).transpose(1, 2)
             audioBatch = self.audioConv(audioInputBatch)
             audioBatch = audioBatch.transpose(1, 2).transpose(0, 1)
             audioBatch = self.positionalEncoding(audioBatch)
-            audioBatch = self.audioEncoder(audioBatch)
+            paddingMask = self.padding_mask(audioBatch, inputLenBatch)
+            audioBatch = self.audioEncoder(audioBatch, src_key_padding_mask=paddingMask)
         else:
             audioBatch = None
 
         if videoInputBatch is not None:
             videoBatch = self.positionalEncoding(videoInputBatch)
-            videoBatch = self.videoEncoder(videoBatch)
+            paddingMask = self.padding_mask(videoBatch, inputLenBatch)
+            videoBatch = self.videoEncoder(videoBatch, src_key_padding_mask=paddingMask)
         else:
             videoBatch = None
 
@@ -96,9 +99,19 @@ class AVNet(nn.Module):
             print("Both audio and visual inputs missing.")
             exit()
 
-        jointBatch = self.jointDecoder(jointBatch)
+        jointBatch = self.jointDecoder(jointBatch, src_key_padding_mask=paddingMask)
         jointBatch = jointBatch.transpose(0, 1).transpose(1, 2)
         jointBatch = self.outputConv(jointBatch)
         jointBatch = jointBatch.transpose(1, 2).transpose(0, 1)
         outputBatch = F.log_softmax(jointBatch, dim=2)
         return outputBatch
+
+
+    def padding_mask(self, batch, inputLenBatch):
+        """
+        Function to mask the padding of the shorter samples in the batch, so that every sample is transcribed as if it
+        was alone.
+        """
+        if inputLenBatch is None:
+            return None
+        return torch.arange(batch.shape[0], device=batch.device).unsqueeze(0) >= inputLenBatch.to(batch.device).unsqueeze(1)
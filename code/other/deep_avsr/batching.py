@@ -0,0 +1,64 @@
+"""
+Batching of the prepared chunks for model inference
+"""
+import numpy as np
+import torch
+
+
+def make_batches(lengths, max_batch_size, padding_budget):
+    """
+    groups samples into length-bucketed batches
+    samples are sorted by length and a batch is closed once it is full or once adding the next sample
+    would make the share of padding frames exceed the budget
+    :param lengths (list(int)): sample lengths
+    :param max_batch_size (int): maximum number of samples in a batch
+    :param padding_budget (float): maximum fraction of padding frames in a batch
+    :return list(list(int)): sample indices of every batch
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    batches = []
+    batch = []
+    batch_len = 0
+    for i in order:
+        if len(batch) > 0:
+            max_len = lengths[batch[0]]
+            padding = 1 - (batch_len + lengths[i]) / (max_len * (len(batch) + 1))
+            if len(batch) >= max_batch_size or padding > padding_budget:
+                batches.append(batch)
+                batch = []
+                batch_len = 0
+        batch.append(i)
+        batch_len += lengths[i]
+    if len(batch) > 0:
+        batches.append(batch)
+    return batches
+
+
+def split_predictions(predictionBatch, predictionLenBatch, indexToChar):
+    """
+    converts decoded character indices of a batch back to text
+    :param predictionBatch (tensor): concatenated predictions, each ending with <EOS>
+    :param predictionLenBatch (tensor): prediction lengths
+    :param indexToChar (dict(int:str)): index to character mapping
+    :return list(str): prediction of every sample
+    """
+    preds = []
+    predictions = predictionBatch.tolist()
+    start = 0
+    for length in predictionLenBatch.tolist():
+        preds.append(''.join([indexToChar[ix] for ix in predictions[start:start + length - 1]]))
+        start += length
+    return preds
+
+
+def collate_log_probs(logProbs):
+    """
+    pads the log probabilities of several samples into a batch for the CTC decoders
+    :param logProbs (list(np.ndarray)): (T, numClasses) log probabilities of every sample
+    :return (tensor, tensor): (T, B, numClasses) log probabilities and sample lengths
+    """
+    lengths = [len(logProb) for logProb in logProbs]
+    outputBatch = np.zeros((max(lengths), len(logProbs), logProbs[0].shape[1]), dtype=np.float32)
+    for i, logProb in enumerate(logProbs):
+        outputBatch[:lengths[i], i] = logProb
+    return torch.from_numpy(outputBatch), torch.tensor(lengths, dtype=torch.int32)
@@ -0,0 +1,313 @@
+"""
+Persistent content-addressed cache of processing artifacts
+"""
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class ArtifactCache:
+    """
+    on-disk store of transcripts, model log probabilities and visual features
+    every entry is a file named after the hash of its key, the least recently used entries are removed once the total
+    size exceeds the limit
+    """
+
+    def __init__(self, directory, max_size, memory_entries=256, mmap_min_size=2 ** 26):
+        """
+        :param directory (str): cache directory
+        :param max_size (int): maximum total size of the entries in bytes
+        :param memory_entries (int): number of recently used arrays kept in memory
+        :param mmap_min_size (int): size in bytes from which arrays are memory-mapped instead of read
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.memory_entries = memory_entries
+        self.mmap_min_size = mmap_min_size
+        self.arrays = OrderedDict()
+        self.computing = dict()
+        self.lock = threading.RLock()
+        self.entries = None
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.file_hashes = dict()
+
+    @staticmethod
+    def key(*parts):
+        """
+        builds an entry key from its parts
+        :param parts: values identifying the entry (their repr must be deterministic)
+        :return (str): key
+        """
+        return hashlib.sha1(repr(parts).encode('utf8')).hexdigest()
+
+    def file_hash(self, filepath):
+        """
+        computes the content hash of a file, hashing it only once for as long as it stays unchanged
+        :param filepath (str): filepath
+        :return (str): hash
+        """
+        stat = os.stat(filepath)
+        path = os.path.abspath(filepath)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if path in self.file_hashes and self.file_hashes[path][0] == stamp:
+                return self.file_hashes[path][1]
+        content_hash = hashlib.sha1()
+        with open(filepath, 'rb') as f:
+            for block in iter(lambda: f.read(2 ** 20), b''):
+                content_hash.update(block)
+        with self.lock:
+            self.file_hashes[path] = (stamp, content_hash.hexdigest())
+        return self.file_hashes[path][1]
+
+    def content_hash(self, value):
+        """
+        computes the content hash of a value: files are hashed by their content, arrays by their type, shape and data
+        :param value (str or np.ndarray or tuple or list or dict): filepath, array or a container of them
+        :return (str): hash
+        """
+        content_hash = hashlib.sha1()
+        if isinstance(value, str):
+            content_hash.update(self.file_hash(value).encode('utf8'))
+        elif isinstance(value, np.ndarray):
+            content_hash.update(repr((value.dtype.str, value.shape)).encode('utf8'))
+            content_hash.update(np.ascontiguousarray(value).data)
+        elif isinstance(value, (tuple, list)):
+            for item in value:
+                content_hash.update(self.content_hash(item).encode('utf8'))
+        elif isinstance(value, dict):
+            for key in sorted(value):
+                content_hash.update(repr(key).encode('utf8'))
+                content_hash.update(self.content_hash(value[key]).encode('utf8'))
+        else:
+            content_hash.update(repr(value).encode('utf8'))
+        return content_hash.hexdigest()
+
+    def load_index(self):
+        """
+        builds the LRU index from the cache directory, file modification times are the last access times
+        :return (void):
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npy') or name.endswith('.json'):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        self.entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self.size = sum(self.entries.values())
+
+    def path(self, key, ext):
+        """
+        gets the filepath of an entry
+        :param key (str): key
+        :param ext (str): entry file extension
+        :return (str): filepath
+        """
+        return os.path.join(self.directory, key + ext)
+
+    def touch(self, name):
+        """
+        marks an entry as the most recently used one
+        :param name (str): entry filename
+        :return (void):
+        """
+        self.entries.move_to_end(name)
+        os.utime(os.path.join(self.directory, name))
+
+    def lookup(self, key, ext):
+        """
+        finds an entry and updates its recency and the hit statistics
+        :param key (str): key
+        :param ext (str): entry file extension
+        :return (str): entry filepath, None if absent
+        """
+        with self.lock:
+            if self.entries is None:
+                self.load_index()
+            name = key + ext
+            if name not in self.entries or not os.path.exists(self.path(key, ext)):
+                self.entries.pop(name, None)
+                self.misses += 1
+                return None
+            self.touch(name)
+            self.hits += 1
+            return self.path(key, ext)
+
+    def store(self, key, ext, write):
+        """
+        writes an entry atomically and evicts the least recently used entries over the size limit
+        :param key (str): key
+        :param ext (str): entry file extension
+        :param write (callable): writes the entry to the provided file object
+        :return (void):
+        """
+        with self.lock:
+            if self.entries is None:
+                self.load_index()
+            name = key + ext
+            temp = self.path(key, '.tmp' + str(threading.get_ident()))
+            with open(temp, 'wb') as f:
+                write(f)
+            try:
+                os.replace(temp, self.path(key, ext))
+            except OSError:
+                # the entry is memory-mapped and cannot be replaced (Windows), the stored copy is kept
+                os.remove(temp)
+                return
+            self.size -= self.entries.pop(name, 0)
+            self.entries[name] = os.path.getsize(self.path(key, ext))
+            self.size += self.entries[name]
+            while self.size > self.max_size and len(self.entries) > 1:
+                evicted, size = self.entries.popitem(last=False)
+                self.size -= size
+                self.arrays.pop(evicted, None)
+                try:
+                    os.remove(os.path.join(self.directory, evicted))
+                except OSError:
+                    pass
+
+    def get(self, key):
+        """
+        gets a JSON entry
+        :param key (str): key
+        :return: value, None if absent
+        """
+        path = self.lookup(key, '.json')
+        if path is None:
+            return None
+        with open(path, 'r', encoding='utf8') as f:
+            return json.load(f)
+
+    def put(self, key, value):
+        """
+        stores a JSON entry
+        :param key (str): key
+        :param value: JSON serializable value
+        :return (void):
+        """
+        self.store(key, '.json', lambda f: f.write(json.dumps(value).encode('utf8')))
+
+    def get_array(self, key, mmap=False):
+        """
+        gets an array entry, recently used arrays are taken from memory
+        :param key (str): key
+        :param mmap (bool): whether to memory-map the array instead of reading it, only arrays of at least
+        mmap_min_size bytes are memory-mapped
+        :return (np.ndarray): read-only array, None if absent
+        """
+        name = key + '.npy'
+        with self.lock:
+            if name in self.arrays and self.entries is not None and name in self.entries:
+                self.arrays.move_to_end(name)
+                self.touch(name)
+                self.hits += 1
+                return self.arrays[name]
+            path = self.lookup(key, '.npy')
+            if path is None:
+                return None
+            # a memory-mapped file cannot be replaced or removed on Windows, so small arrays are read into memory
+            mmap = mmap and os.path.getsize(path) >= self.mmap_min_size
+            array = np.load(path, mmap_mode='r' if mmap else None)
+            array.flags.writeable = False
+            self.remember(name, array)
+            return array
+
+    def put_array(self, key, array):
+        """
+        stores an array entry
+        :param key (str): key
+        :param array (np.ndarray): array
+        :return (np.ndarray): read-only view of the array
+        """
+        with self.lock:
+            self.store(key, '.npy', lambda f: np.save(f, array))
+            array = array.view()
+            array.flags.writeable = False
+            self.remember(key + '.npy', array)
+            return array
+
+    def get_or_compute_array(self, key, compute, mmap=False):
+        """
+        gets an array entry, computing and storing it if absent
+        concurrent requests of the same absent entry compute it only once, the other threads wait for the result
+        :param key (str): key
+        :param compute (callable): computes the array
+        :param mmap (bool): whether to memory-map the array instead of reading it
+        :return (np.ndarray): read-only array
+        """
+        while True:
+            with self.lock:
+                array = self.get_array(key, mmap)
+                if array is not None:
+                    return array
+                event = self.computing.get(key)
+                if event is None:
+                    event = self.computing[key] = threading.Event()
+                    break
+            # another thread is computing the entry, if it fails the entry is computed by one of the waiting threads
+            event.wait()
+        try:
+            # the computed array is returned as is, the entry may already be evicted by another thread
+            array = self.put_array(key, compute())
+        finally:
+            with self.lock:
+                del self.computing[key]
+            event.set()
+        return array
+
+    def remember(self, name, array):
+        """
+        keeps an array in memory, forgetting the least recently used one over the limit
+        :param name (str): entry filename
+        :param array (np.ndarray): array
+        :return (void):
+        """
+        self.arrays[name] = array
+        self.arrays.move_to_end(name)
+        while len(self.arrays) > self.memory_entries:
+            self.arrays.popitem(last=False)
+
+    def clear(self):
+        """
+        removes all the entries
+        :return (void):
+        """
+        with self.lock:
+            if self.entries is None:
+                self.load_index()
+            self.arrays = OrderedDict()
+            for name in self.entries:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+            self.entries = OrderedDict()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        gets the cache statistics
+        :return (dict(str:int)): number of entries, total size and size limit in bytes, hits and misses
+        """
+        with self.lock:
+            if self.entries is None:
+                self.load_index()
+            return {
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+cache = ArtifactCache(str(pathlib.Path(__file__).parent.resolve().parents[1] / 'cache'), 2 ** 30)
@@ -0,0 +1,257 @@
+"""
+Inference engine shared by all the prediction modes
+"""
+import os
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import torch
+from scipy.io import wavfile
+from .registry import registry
+from .cache import cache
+from .batching import make_batches, split_predictions, collate_log_probs
+from .audio_visual.models.lrs2_char_lm import LRS2CharLM
+from .audio_visual.utils.decoders import ctc_greedy_decode, ctc_search_decode, LMScorer
+
+
+class ModalityFrontend:
+    """
+    mode-specific part of the inference: the model, the preprocessing of a chunk and the model input
+    the engine owns everything else (device placement, model loading, caching, batching and decoding)
+    """
+    # registry name of the model
+    name = None
+    # whether the mode reads the audio, noise is only loaded for such modes
+    uses_audio = False
+
+    def build_model(self, config):
+        """
+        creates an untrained model instance
+        :param config (InferenceConfig): model configuration
+        :return (torch.nn.Module): model
+        """
+        raise NotImplementedError
+
+    def load(self, config, device):
+        """
+        loads the modules the preprocessing needs besides the model
+        :param config (InferenceConfig): model configuration
+        :param device (torch.device): device to place the modules on
+        :return (void):
+        """
+        pass
+
+    def prepare(self, chunk, config, noise):
+        """
+        converts a chunk into a model input sample
+        :param chunk (str or dict): video filepath or decoded chunk {'audio': (rate, samples), 'video': frames}
+        :param config (InferenceConfig): model configuration
+        :param noise (np.ndarray): noise samples, None if noise is not added
+        :return (tuple): (input, None, input length, None) sample for collate_fn
+        """
+        raise NotImplementedError
+
+    def collate(self, samples):
+        """
+        collates the prepared samples into a batch
+        :param samples (list(tuple)): prepared samples
+        :return (tuple): input batch and input lengths
+        """
+        raise NotImplementedError
+
+    def model_input(self, inputBatch, config, device):
+        """
+        moves an input batch to the device in the form the model expects
+        :param inputBatch (tensor): input batch
+        :param config (InferenceConfig): model configuration
+        :param device (torch.device): device
+        :return: model input
+        """
+        return (inputBatch.float()).to(device)
+
+
+class StageProfiler:
+    """
+    accumulates the wall time and the number of calls of every inference stage
+    """
+
+    def __init__(self, synchronize=False):
+        """
+        :param synchronize (bool): whether to wait for the CUDA kernels before stopping the clock
+        """
+        self.synchronize = synchronize
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        times a stage
+        :param name (str): stage name
+        :return (void):
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.synchronize:
+                torch.cuda.synchronize()
+            total, calls = self.stages.get(name, (0, 0))
+            self.stages[name] = (total + time.perf_counter() - start, calls + 1)
+
+    def report(self):
+        """
+        formats the stage timings
+        :return (str): one line per stage
+        """
+        return '\n'.join(f'{name}: {total:.3f} s ({calls} calls)' for name, (total, calls) in self.stages.items())
+
+
+@contextmanager
+def no_profiling(name):
+    """
+    stage timer used when profiling is off
+    :param name (str): stage name
+    :return (void):
+    """
+    yield
+
+
+def predict(files, config, frontend, profiler=None, progress=None):
+    """
+    driver function for model prediction
+    :param files (dict(str:list)): filepath - chunks, a chunk is a video filepath or a decoded chunk
+    {'audio': (rate, samples), 'video': frames} with optionally its log probabilities cache key ('key') and its cached
+    log probabilities ('log_probs'), a chunk with cached log probabilities needs no audio nor video
+    :param config (InferenceConfig): model configuration
+    :param frontend (ModalityFrontend): front end of the mode
+    :param profiler (StageProfiler): collects the stage timings, when None and the PROFILE_INFERENCE config
+    parameter is set a profiler is created and its report printed
+    :param progress (callable): called with (filepath, transcript of the chunks decoded so far, number of decoded
+    chunks, number of chunks) every time chunks of a file are decoded
+    :return (dict(str:str)): prediction result
+    """
+    print(frontend.name, 'lm decoder noise db: ', config.args["USE_LM"], config.args["TEST_DEMO_DECODING"],
+          config.args["TEST_DEMO_NOISY"], config.args["NOISE_SNR_DB"])
+    result = dict()
+    np.random.seed(config.args["SEED"])
+    torch.manual_seed(config.args["SEED"])
+    gpuAvailable = torch.cuda.is_available()
+    device = torch.device("cuda" if gpuAvailable else "cpu")
+    # larger batches only pay off on GPU, on CPU the gain stops growing at a few chunks while the first partial
+    # transcripts come later
+    batchSize = config.args["INFERENCE_BATCH_SIZE"] if gpuAvailable else config.args["INFERENCE_CPU_BATCH_SIZE"]
+    report = profiler is None and config.args["PROFILE_INFERENCE"]
+    if report:
+        profiler = StageProfiler(gpuAvailable)
+    stage = profiler.stage if profiler is not None else no_profiling
+    if config.args["TRAINED_MODEL_FILE"] is None:
+        return result
+
+    with stage('load'):
+        # getting the model, the front end modules and the language model (loaded once per process)
+        model = registry.get(frontend.name, lambda: frontend.build_model(config),
+                             config.args["CODE_DIRECTORY"] + config.args["TRAINED_MODEL_FILE"], device)
+        frontend.load(config, device)
+        if config.args["USE_LM"]:
+            lm = registry.get('language-model', LRS2CharLM, config.args["TRAINED_LM_FILE"], device)
+            lm = LMScorer(lm, config.args["CHAR_TO_INDEX"][" "], config.args["LM_CACHE_SIZE"])
+        else:
+            lm = None
+
+        # reading the noise file
+        if frontend.uses_audio and config.args["TEST_DEMO_NOISY"]:
+            _, noise = wavfile.read(os.path.join(config.args["DATA_DIRECTORY"], "noise.wav"))
+        else:
+            noise = None
+
+    # walking through the chunks of all the files, chunks with cached log probabilities skip preprocessing and the model
+    modelKey = config.model_key()
+    samples = list()
+    logProbs = list()
+    pending = list()
+    fileSamples = dict()
+    for filepath, file_chunks in files.items():
+        result[filepath] = ''
+        fileSamples[filepath] = list()
+        for chunk in file_chunks:
+            if not isinstance(chunk, dict) and not chunk.endswith(".mp4"):
+                continue
+            with stage('cache'):
+                # decoded chunks of the application carry their key and possibly their already looked up log
+                # probabilities, other chunks are keyed by their content
+                chunkKey = chunk.get('key') if isinstance(chunk, dict) else None
+                if chunkKey is None:
+                    chunkKey = cache.key('log-probs', modelKey, cache.content_hash(chunk))
+                logProb = chunk.get('log_probs') if isinstance(chunk, dict) else None
+                fileSamples[filepath].append(len(samples))
+                samples.append((filepath, chunkKey))
+                logProbs.append(logProb if logProb is not None else cache.get_array(chunkKey, mmap=True))
+            if logProbs[-1] is None:
+                with stage('preprocess'):
+                    pending.append((len(samples) - 1, frontend.prepare(chunk, config, noise)))
+
+    samplePreds = [None] * len(samples)
+
+    def decode(batch):
+        # decoding the log probabilities of a batch of samples
+        with stage('decode'):
+            outputBatch, inputLenBatch = collate_log_probs([logProbs[ix] for ix in batch])
+
+            # obtaining the prediction using CTC deocder
+            if config.args["TEST_DEMO_DECODING"] == "greedy":
+                predictionBatch, predictionLenBatch = ctc_greedy_decode(outputBatch, inputLenBatch,
+                                                                        config.args["CHAR_TO_INDEX"]["<EOS>"])
+            else:
+                beamSearchParams = {"beamWidth": config.args["BEAM_WIDTH"], "alpha": config.args["LM_WEIGHT_ALPHA"],
+                                    "beta": config.args["LENGTH_PENALTY_BETA"],
+                                    "threshProb": config.args["THRESH_PROBABILITY"]}
+                predictionBatch, predictionLenBatch = ctc_search_decode(outputBatch, inputLenBatch,
+                                                                        beamSearchParams,
+                                                                        config.args["CHAR_TO_INDEX"][" "],
+                                                                        config.args["CHAR_TO_INDEX"]["<EOS>"], lm)
+
+            # converting character indices back to characters
+            preds = split_predictions(predictionBatch, predictionLenBatch, config.args["INDEX_TO_CHAR"])
+            for ix, pred in zip(batch, preds):
+                samplePreds[ix] = pred
+
+        # reporting the partial transcripts of the files with chunks in the batch
+        if progress is not None:
+            for filepath in OrderedDict((samples[ix][0], None) for ix in batch):
+                decoded = [samplePreds[ix] for ix in fileSamples[filepath] if samplePreds[ix] is not None]
+                progress(filepath, ' '.join(decoded), len(decoded), len(fileSamples[filepath]))
+
+    # decoding length-bucketed batches of the chunks found in the cache first, they are ready at once
+    cached = [ix for ix, logProb in enumerate(logProbs) if logProb is not None]
+    for batch in make_batches([len(logProbs[ix]) for ix in cached], batchSize, config.args["INFERENCE_PADDING_BUDGET"]):
+        decode([cached[i] for i in batch])
+
+    # running the model on length-bucketed batches of the chunks missing from the cache, every batch is decoded as soon
+    # as its log probabilities are ready
+    batches = make_batches([int(sample[2]) for _, sample in pending], batchSize,
+                           config.args["INFERENCE_PADDING_BUDGET"])
+    for batch in batches:
+        with stage('model'):
+            inputBatch, inputLenBatch = frontend.collate([pending[ix][1] for ix in batch])
+            inputBatch = frontend.model_input(inputBatch, config, device)
+            with torch.no_grad():
+                outputBatch = model(inputBatch, inputLenBatch)
+            outputBatch = outputBatch.cpu().numpy()
+
+        # storing the log probabilities of every chunk without the padding
+        with stage('cache'):
+            for i, ix in enumerate(batch):
+                sampleIx = pending[ix][0]
+                logProbs[sampleIx] = np.ascontiguousarray(outputBatch[:int(inputLenBatch[i]), i])
+                cache.put_array(samples[sampleIx][1], logProbs[sampleIx])
+
+        decode([pending[ix][0] for ix in batch])
+
+    for (filepath, _), pred in zip(samples, samplePreds):
+        if result[filepath] != '':
+            result[filepath] += ' '
+        result[filepath] += pred
+    if report:
+        print(profiler.report())
+    return result
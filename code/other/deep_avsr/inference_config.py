@@ -0,0 +1,143 @@
+"""
+In-memory inference configuration
+"""
+import os
+from .audio_only.config import args as audio_only_args
+from .video_only.config import args as video_only_args
+from .audio_visual.config import args as audio_visual_args
+from .cache import cache
+
+# version of the model outputs in the cache keys, increased when the same inputs and checkpoints give different
+# outputs: 2 - the padding of batched chunks is masked, earlier outputs depended on the other chunks of the batch
+OUTPUT_VERSION = 2
+
+defaults = {
+    'audio-only': audio_only_args,
+    'video-only': video_only_args,
+    'audio-video': audio_visual_args
+}
+
+
+def to_bool(value):
+    """
+    converts a config value to bool
+    :param value (bool or str): config value
+    :return (bool): converted value
+    """
+    if isinstance(value, str):
+        return value.strip().lower() == 'true'
+    return bool(value)
+
+
+class InferenceConfig:
+    """
+    per-run model configuration: the defaults of a mode with the application settings applied on top
+    instances are never modified after creation, so they can be shared between threads
+    """
+
+    def __init__(self, mode, decoding='greedy', use_lm=False, noisy=False, noise_snr_db=100, video_snr=100):
+        """
+        :param mode (str): prediction mode
+        :param decoding (str): CTC decoding type - 'greedy' or 'search'
+        :param use_lm (bool): whether to use the language model for decoding
+        :param noisy (bool): whether to add noise to audio
+        :param noise_snr_db (int): audio noise level in dB SNR
+        :param video_snr (int): video noise level in dB SNR
+        """
+        if decoding not in ['greedy', 'search']:
+            raise ValueError(f'unknown decoding type: {decoding}')
+        self.mode = mode
+        self.decoding = str(decoding)
+        self.use_lm = to_bool(use_lm)
+        self.noisy = to_bool(noisy)
+        self.noise_snr_db = int(noise_snr_db)
+        self.video_snr = int(video_snr)
+        self.args = dict(defaults[mode])
+        self.args['TEST_DEMO_DECODING'] = self.decoding
+        self.args['USE_LM'] = self.use_lm
+        self.args['TEST_DEMO_NOISY'] = self.noisy
+        self.args['NOISE_SNR_DB'] = self.noise_snr_db
+
+    @classmethod
+    def from_settings(cls, mode, settings):
+        """
+        creates a config from the application settings
+        :param mode (str): prediction mode
+        :param settings (dict(str:str)): application settings (config.txt content)
+        :return (InferenceConfig): config
+        """
+        return cls(mode,
+                   decoding=settings['Decoder'],
+                   use_lm=settings['Use LM'],
+                   noisy=settings['Use noise'],
+                   noise_snr_db=settings['Audio SNR'],
+                   video_snr=settings['Video SNR'])
+
+    def replace(self, **kwargs):
+        """
+        creates a copy of the config with the provided settings changed
+        :param kwargs: InferenceConfig arguments to change
+        :return (InferenceConfig): config
+        """
+        params = {
+            'mode': self.mode,
+            'decoding': self.decoding,
+            'use_lm': self.use_lm,
+            'noisy': self.noisy,
+            'noise_snr_db': self.noise_snr_db,
+            'video_snr': self.video_snr
+        }
+        params.update(kwargs)
+        return InferenceConfig(**params)
+
+    def checkpoint_files(self, lm=True):
+        """
+        gets the checkpoint files the configuration predicts with
+        :param lm (bool): whether to include the language model checkpoint
+        :return (list(str)): checkpoint filepaths
+        """
+        files = []
+        if self.args['TRAINED_MODEL_FILE'] is not None:
+            files.append(self.args['CODE_DIRECTORY'] + self.args['TRAINED_MODEL_FILE'])
+        if self.mode != 'audio-only':
+            files.append(self.args['TRAINED_FRONTEND_FILE'])
+        if lm and self.use_lm:
+            files.append(self.args['TRAINED_LM_FILE'])
+        return files
+
+    def model_key(self):
+        """
+        gets the settings and checkpoints that affect the model output (but not its decoding)
+        :return (tuple): settings and checkpoint content hashes
+        """
+        checkpoints = [cache.file_hash(file) if os.path.exists(file) else file for file in self.checkpoint_files(False)]
+        return (OUTPUT_VERSION, self.mode, self.args.get('TEST_DEMO_MODE'), self.noisy, self.noise_snr_db,
+                tuple(checkpoints))
+
+    def frontend_key(self):
+        """
+        gets the content hash of the visual frontend checkpoint, None for audio-only
+        :return (str): hash or checkpoint path if it does not exist
+        """
+        if self.mode == 'audio-only':
+            return None
+        file = self.args['TRAINED_FRONTEND_FILE']
+        return cache.file_hash(file) if os.path.exists(file) else file
+
+    def key(self):
+        """
+        gets the settings that affect the prediction result
+        :return (tuple): settings
+        """
+        key = (OUTPUT_VERSION, self.mode, self.decoding, self.use_lm, self.noisy, self.noise_snr_db, self.video_snr)
+        if self.decoding == 'search':
+            key += (self.args['BEAM_WIDTH'], self.args['LM_WEIGHT_ALPHA'], self.args['LENGTH_PENALTY_BETA'],
+                    self.args['THRESH_PROBABILITY'])
+        return key
+
+    def __getitem__(self, key):
+        return self.args[key]
+
+    def __repr__(self):
+        return f'InferenceConfig(mode={self.mode!r}, decoding={self.decoding!r}, use_lm={self.use_lm}, ' \
+               f'noisy={self.noisy}, noise_snr_db={self.noise_snr_db}, video_snr={self.video_snr})'
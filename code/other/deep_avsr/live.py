@@ -0,0 +1,158 @@
+"""
+Live transcription of a recording in progress
+"""
+import numpy as np
+import torch
+from .registry import registry
+from .batching import collate_log_probs, split_predictions
+from .audio_visual.utils.decoders import ctc_greedy_decode
+from .audio_only.data.utils import StreamingSTFT
+
+
+class LiveTranscriber:
+    """
+    transcribes a growing audio stream with the audio-only model: overlapping windows of the latest samples are passed
+    to the model and the log probabilities are stitched at the frame level, every output frame is taken from the
+    window where it is the closest to the centre, so it is predicted with context on both sides
+    the stitched frames are decoded greedily, the frames at the end of the latest window are only tentative and are
+    replaced by the next window
+    the committed frames are decoded once and only their transcript and last frame are kept, the last frame carries the
+    greedy decoding over to the following frames so a repeated character is merged as if the frames were decoded at once
+    the STFT features are extracted once per sample as the stream grows, only those of the latest windows are kept
+    """
+
+    def __init__(self, config, frontend, sampFreq=16000):
+        """
+        :param config (InferenceConfig): audio-only model configuration
+        :param frontend (ModalityFrontend): audio-only front end
+        :param sampFreq (int): sampling rate of the stream
+        """
+        self.config = config
+        self.sampFreq = sampFreq
+        self.stft = StreamingSTFT(sampFreq, {"stftWindow": config.args["STFT_WINDOW"],
+                                             "stftWinLen": config.args["STFT_WIN_LENGTH"],
+                                             "stftOverlap": config.args["STFT_OVERLAP"]})
+        self.stftHop = self.stft.hop
+        # the model turns every 4 STFT vectors into one output frame
+        self.frameLen = 4 * self.stftHop
+        self.window = int(round(config.args["LIVE_WINDOW"] * sampFreq / self.frameLen))
+        self.hop = int(round(config.args["LIVE_HOP"] * sampFreq / self.frameLen))
+        self.context = (self.window - self.hop) // 2
+        # stream position of the next sample to extract the features of
+        self.position = 0
+        # features of the latest STFT vectors and the index of the first one in the stream
+        self.features = np.zeros((0, config.args["AUDIO_FEATURE_SIZE"]), dtype=np.float32)
+        self.featureStart = 0
+        self.end = self.hop
+        self.committed = 0
+        # transcript of the committed frames, the last of them and its own transcript
+        self.text = ''
+        self.last = None
+        self.lastText = ''
+        self.tentative = None
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.model = registry.get(frontend.name, lambda: frontend.build_model(config),
+                                  config.args["CODE_DIRECTORY"] + config.args["TRAINED_MODEL_FILE"], self.device)
+
+    def extract(self, buffer):
+        """
+        extracts the features of the samples written since the previous call
+        if the samples have been overwritten in the meantime, the extraction restarts at the oldest kept sample on an
+        output frame boundary
+        :param buffer (SampleRingBuffer): stream samples
+        :return (void):
+        """
+        views = buffer.read(self.position)
+        if views is None:
+            self.position = -(-(buffer.total - buffer.capacity) // self.frameLen) * self.frameLen
+            self.stft.reset()
+            self.features = self.features[:0]
+            self.featureStart = self.position // self.stftHop
+            views = buffer.read(self.position)
+            if views is None:
+                return
+        features = [self.features]
+        for view in views:
+            features.append(self.stft.process(view))
+            self.position += len(view)
+        features = np.concatenate(features)
+        # keeping the vectors of the latest window and of the frames it may be extended by
+        drop = max(len(features) - 4 * (self.window + self.hop + 1), 0)
+        self.features = features[drop:]
+        self.featureStart += drop
+
+    def log_probs(self, start, stop):
+        """
+        runs the model on a window of the stream
+        :param start (int): first output frame of the window
+        :param stop (int): output frame after the last one of the window
+        :return (np.ndarray): (stop - start, numClasses) log probabilities
+        """
+        inp = self.features[4 * start - self.featureStart:4 * stop - self.featureStart]
+        inputBatch = torch.from_numpy(inp).unsqueeze(1).to(self.device)
+        with torch.no_grad():
+            outputBatch = self.model(inputBatch)
+        return outputBatch[:, 0].cpu().numpy()
+
+    def update(self, buffer):
+        """
+        transcribes the windows completed since the previous call
+        when the model falls behind the stream by more than a window step, the windows in between are skipped to keep
+        the latency bounded
+        :param buffer (SampleRingBuffer): stream samples
+        :return (str): transcript of the stream so far
+        """
+        self.extract(buffer)
+        # number of output frames whose features are all extracted
+        available = (self.featureStart + len(self.features)) // 4
+        if available - self.end >= self.hop:
+            self.end = available
+        while self.end <= available:
+            start = max(self.end - self.window, -(-self.featureStart // 4))
+            logProbs = self.log_probs(start, self.end)
+            # committing the frames up to the right context of the window
+            commit = self.end - self.context
+            first = max(self.committed, start)
+            if commit > first:
+                frames = logProbs[first - start:commit - start]
+                self.text += self.continue_decode(frames)
+                self.last = frames[-1:]
+                self.lastText = self.decode(self.last)
+                self.committed = commit
+            self.tentative = logProbs[max(self.committed, start) - start:]
+            self.end += self.hop
+        return self.transcript()
+
+    def decode(self, frames):
+        """
+        decodes frames greedily
+        :param frames (np.ndarray): (T, numClasses) log probabilities
+        :return (str): transcript
+        """
+        outputBatch, inputLenBatch = collate_log_probs([frames])
+        predictionBatch, predictionLenBatch = ctc_greedy_decode(outputBatch, inputLenBatch,
+                                                                self.config.args["CHAR_TO_INDEX"]["<EOS>"])
+        return split_predictions(predictionBatch, predictionLenBatch, self.config.args["INDEX_TO_CHAR"])[0]
+
+    def continue_decode(self, frames):
+        """
+        decodes frames following the committed ones greedily
+        the last committed frame is decoded again in front of them, its character is already in the committed
+        transcript and is removed
+        :param frames (np.ndarray): (T, numClasses) log probabilities
+        :return (str): transcript of the frames
+        """
+        if len(frames) == 0:
+            return ''
+        if self.last is None:
+            return self.decode(frames)
+        return self.decode(np.concatenate([self.last, frames]))[len(self.lastText):]
+
+    def transcript(self):
+        """
+        appends the transcript of the tentative frames to the one of the committed frames
+        :return (str): transcript
+        """
+        if self.tentative is None:
+            return self.text
+        return self.text + self.continue_decode(self.tentative)
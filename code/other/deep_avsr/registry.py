@@ -0,0 +1,95 @@
+"""
+Process-wide registry of loaded models
+"""
+import threading
+import time
+import torch
+
+
+class ModelRegistry:
+    """
+    keeps deserialized models in memory so that repeated predictions (and concurrently running modes)
+    share a single copy of every checkpoint
+    """
+
+    def __init__(self):
+        self.entries = dict()
+        self.lock = threading.RLock()
+
+    def get(self, name, builder, path, device):
+        """
+        gets a model, loading the checkpoint only if it is not loaded yet or its path or device has changed
+        :param name (str): model name
+        :param builder (callable): creates an untrained model instance
+        :param path (str): checkpoint filepath
+        :param device (torch.device): device to place the model on
+        :return (torch.nn.Module): model in evaluation mode
+        """
+        device = torch.device(device)
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None and entry['path'] == path and entry['device'] == device:
+                return entry['model']
+            if entry is not None:
+                self.evict(name)
+            start = time.perf_counter()
+            model = builder()
+            model.load_state_dict(torch.load(path, map_location=device))
+            model.to(device)
+            model.eval()
+            load_time = time.perf_counter() - start
+            self.entries[name] = {
+                'model': model,
+                'path': path,
+                'device': device,
+                'load_time': load_time,
+                'memory': get_model_memory(model)
+            }
+            return model
+
+    def evict(self, name):
+        """
+        removes a model from the registry
+        :param name (str): model name
+        :return (bool): whether the model was loaded
+        """
+        with self.lock:
+            entry = self.entries.pop(name, None)
+        if entry is None:
+            return False
+        if entry['device'].type == 'cuda':
+            del entry
+            torch.cuda.empty_cache()
+        return True
+
+    def clear(self):
+        """
+        removes all models from the registry
+        :return (void):
+        """
+        with self.lock:
+            names = list(self.entries.keys())
+        for name in names:
+            self.evict(name)
+
+    def stats(self):
+        """
+        gets load statistics of the loaded models
+        :return (dict(str:dict)): model name - {path, device, load time in seconds, resident memory in bytes}
+        """
+        with self.lock:
+            return {name: {key: val for key, val in entry.items() if key != 'model'}
+                    for name, entry in self.entries.items()}
+
+
+def get_model_memory(model):
+    """
+    computes the memory occupied by the model parameters and buffers
+    :param model (torch.nn.Module): model
+    :return (int): memory in bytes
+    """
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(i.numel() * i.element_size() for i in tensors)
+
+
+registry = ModelRegistry()
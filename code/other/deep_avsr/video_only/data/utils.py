@@ -17,6 +17,7 @@ def prepare_main_input(visualFeaturesFile, targetFile, reqInpLen, charToIx, vide
 
     """
     Function to convert the data sample (visual features file, target file) in the main dataset into appropriate tensors.
+    The visual features can also be given directly as an array.
     """
 
     if targetFile is not None:
@@ -37,7 +38,10 @@ def prepare_main_input(visualFeaturesFile, targetFile, reqInpLen, charToIx, vide
 
 
     #loading the visual features
-    inp = np.load(visualFeaturesFile)
+    if isinstance(visualFeaturesFile, str):
+        inp = np.load(visualFeaturesFile)
+    else:
+        inp = visualFeaturesFile
 
 
     #checking whether the input length is greater than or equal to the required length
@@ -59,12 +59,23 @@ class VideoNet(nn.Module):
         return
 
 
-    def forward(self, inputBatch):
+    def forward(self, inputBatch, inputLenBatch=None):
+        paddingMask = self.padding_mask(inputBatch, inputLenBatch)
         batch = self.positionalEncoding(inputBatch)
-        batch = self.videoEncoder(batch)
-        batch = self.videoDecoder(batch)
+        batch = self.videoEncoder(batch, src_key_padding_mask=paddingMask)
+        batch = self.videoDecoder(batch, src_key_padding_mask=paddingMask)
         batch = batch.transpose(0, 1).transpose(1, 2)
         batch = self.outputConv(batch)
         batch = batch.transpose(1, 2).transpose(0, 1)
         outputBatch = F.log_softmax(batch, dim=2)
         return outputBatch
+
+
+    def padding_mask(self, batch, inputLenBatch):
+        """
+        Function to mask the padding of the shorter samples in the batch, so that every sample is transcribed as if it
+        was alone.
+        """
+        if inputLenBatch is None:
+            return None
+        return torch.arange(batch.shape[0], device=batch.device).unsqueeze(0) >= inputLenBatch.to(batch.device).unsqueeze(1)
@@ -7,7 +7,7 @@ https://github.com/lordmartian/deep_avsr
 
 import torch
 import numpy as np
-from itertools import groupby
+from collections import OrderedDict
 
 
 np.seterr(divide="ignore")
@@ -20,6 +20,8 @@ def ctc_greedy_decode(outputBatch, inputLenBatch, eosIx, blank=0):
     Greedy search technique for CTC decoding.
     This decoding method selects the most probable character at each time step. This is followed by the usual CTC decoding
     to get the predicted transcription.
+    The whole (T, B) batch is decoded at once: repeated characters, blanks and time steps beyond the input length are
+    removed with masks instead of a loop over the utterances.
     Note: The probability assigned to <EOS> token is added to the probability of the blank token before decoding
     to avoid <EOS> predictions in middle of transcriptions. Once decoded, <EOS> token is appended at last to the
     predictions for uniformity with targets.
@@ -27,124 +29,189 @@ def ctc_greedy_decode(outputBatch, inputLenBatch, eosIx, blank=0):
 
     outputBatch = outputBatch.cpu()
     inputLenBatch = inputLenBatch.cpu()
-    outputBatch[:,:,blank] = torch.log(torch.exp(outputBatch[:,:,blank]) + torch.exp(outputBatch[:,:,eosIx]))
+    blankLogProbs = torch.log(torch.exp(outputBatch[:,:,blank]) + torch.exp(outputBatch[:,:,eosIx]))
     reqIxs = np.arange(outputBatch.shape[2])
     reqIxs = reqIxs[reqIxs != eosIx]
     outputBatch = outputBatch[:,:,reqIxs]
-
-    predCharIxs = torch.argmax(outputBatch, dim=2).T.numpy()
-    inpLens = inputLenBatch.numpy()
-    preds = list()
-    predLens = list()
-    for i in range(len(predCharIxs)):
-        pred = predCharIxs[i]
-        ilen = inpLens[i]
-        pred = pred[:ilen]
-        pred = np.array([x[0] for x in groupby(pred)])
-        pred = pred[pred != blank]
-        pred = list(pred)
-        pred.append(eosIx)
-        preds.extend(pred)
-        predLens.append(len(pred))
-    predictionBatch = torch.tensor(preds).int()
-    predictionLenBatch = torch.tensor(predLens).int()
+    outputBatch[:,:,blank] = blankLogProbs
+
+    #most probable character at each time step, one row per utterance
+    predCharIxs = torch.argmax(outputBatch, dim=2).T
+    maxT = predCharIxs.shape[1]
+
+    #keeping the first character of every run, dropping the blanks and the time steps beyond the input length
+    repeatMask = torch.ones_like(predCharIxs, dtype=torch.bool)
+    repeatMask[:,1:] = predCharIxs[:,1:] != predCharIxs[:,:-1]
+    blankMask = predCharIxs != blank
+    lengthMask = torch.arange(maxT).unsqueeze(0) < inputLenBatch.long().unsqueeze(1)
+    keepMask = repeatMask & blankMask & lengthMask
+
+    #appending <EOS> to every prediction and flattening the kept characters utterance by utterance
+    eosColumn = torch.full((predCharIxs.shape[0], 1), eosIx, dtype=predCharIxs.dtype)
+    predCharIxs = torch.cat([predCharIxs, eosColumn], dim=1)
+    keepMask = torch.cat([keepMask, torch.ones_like(eosColumn, dtype=torch.bool)], dim=1)
+    predictionBatch = predCharIxs[keepMask].int()
+    predictionLenBatch = keepMask.sum(dim=1).int()
     return predictionBatch, predictionLenBatch
 
 
 
-class BeamEntry:
-    """
-    Class for a single entry in the beam.
-    """
-    def __init__(self):
-        self.logPrTotal = -np.inf
-        self.logPrNonBlank = -np.inf
-        self.logPrBlank = -np.inf
-        self.logPrText = 0
-        self.lmApplied = False
-        self.lmState = None
-        self.labeling = tuple()
-
-
-
-class BeamState:
+class PrefixTrie:
 
     """
-    Class for the beam.
+    Class for the prefix tree of all the labelings seen during the beam search.
+    Every labeling is a node identified by a single integer, so the beam stores node indices instead of growing tuples.
     """
 
-    def __init__(self, alpha, beta):
-        self.entries = dict()
-        self.alpha = alpha
-        self.beta = beta
+    def __init__(self, capacity=1024):
+        self.parent = np.full(capacity, -1, dtype=np.int64)
+        self.char = np.full(capacity, -1, dtype=np.int64)
+        self.depth = np.zeros(capacity, dtype=np.int64)
+        self.lmLogProbs = [None]
+        self.children = dict()
+        self.size = 1
 
 
-    def score(self, entry):
+    def child(self, node, char):
         """
-        Function to compute score of each entry in the beam.
+        Function to get the node of a labeling extended by a character, adding it to the tree if needed.
         """
-        labelingLen = len(entry.labeling)
-        if labelingLen == 0:
-            score = entry.logPrTotal + self.alpha*entry.logPrText
-        else:
-            score = (entry.logPrTotal + self.alpha*entry.logPrText)/(labelingLen**self.beta)
-        return score
-
-
-    def sort(self):
+        key = (node, char)
+        ix = self.children.get(key)
+        if ix is None:
+            ix = self.size
+            if ix == len(self.parent):
+                self.parent = np.concatenate([self.parent, np.full(ix, -1, dtype=np.int64)])
+                self.char = np.concatenate([self.char, np.full(ix, -1, dtype=np.int64)])
+                self.depth = np.concatenate([self.depth, np.zeros(ix, dtype=np.int64)])
+            self.parent[ix] = node
+            self.char[ix] = char
+            self.depth[ix] = self.depth[node] + 1
+            self.lmLogProbs.append(None)
+            self.children[key] = ix
+            self.size += 1
+        return ix
+
+
+    def labeling(self, node):
         """
-        Function to sort all the beam entries in descending order depending on their scores.
+        Function to get the characters of the labeling of a node.
         """
-        beams = [entry for (key, entry) in self.entries.items()]
-        sortedBeams = sorted(beams, reverse=True, key=self.score)
-        return [x.labeling for x in sortedBeams]
+        labeling = list()
+        while node > 0:
+            labeling.append(int(self.char[node]))
+            node = self.parent[node]
+        return labeling[::-1]
 
 
 
-def apply_lm(parentBeam, childBeam, spaceIx, lm):
-
+def beam_scores(trie, nodes, logPrTotal, logPrText, alpha, beta):
     """
-    Applying the language model to obtain the language model character probabilities at a time step
-    given all the previous characters.
+    Function to compute score of each entry in the beam.
     """
-
-    if not (childBeam.lmApplied):
-        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        if parentBeam.lmState == None:
-            initStateBatch = None
-            inputBatch = torch.tensor(spaceIx-1).reshape(1,1)
-            inputBatch = inputBatch.to(device)
-        else:
-            initStateBatch = parentBeam.lmState
-            inputBatch = torch.tensor(parentBeam.labeling[-1]-1).reshape(1,1)
-            inputBatch = inputBatch.to(device)
-        lm.eval()
-        with torch.no_grad():
-            outputBatch, finalStateBatch = lm(inputBatch, initStateBatch)
-        logProbs = outputBatch.squeeze()
-        logProb = logProbs[childBeam.labeling[-1]-1]
-        childBeam.logPrText = parentBeam.logPrText + logProb
-        childBeam.lmApplied = True
-        childBeam.lmState = finalStateBatch
-    return
+    scores = logPrTotal + alpha*logPrText
+    depths = trie.depth[nodes]
+    return np.where(depths > 0, scores/np.power(np.maximum(depths, 1), beta), scores)
 
 
 
-def add_beam(beamState, labeling):
+def top_k(scores, k):
     """
-    Function to add a new entry to the beam.
+    Function to get the indices of the k highest scores in descending order. Only the selected entries are sorted.
+    Equal scores keep their original order, just like a stable sort of all the scores.
     """
-    if labeling not in beamState.entries.keys():
-        beamState.entries[labeling] = BeamEntry()
+    if len(scores) > k:
+        kthScore = -np.partition(-scores, k-1)[k-1]
+        above = np.flatnonzero(scores > kthScore)
+        equal = np.flatnonzero(scores == kthScore)[:k-len(above)]
+        ixs = np.concatenate([above, equal])
+    else:
+        ixs = np.arange(len(scores))
+    return ixs[np.lexsort((ixs, -scores[ixs]))]
+
 
 
+class LMScorer:
 
-def log_add(a, b):
     """
-    Addition of log probabilities.
+    Class for scoring labelings with the character-level language model.
+    The LM states and the log probabilities of the next character are kept in an LRU cache keyed by the labeling, so a
+    prefix shared by several beams (or several utterances) is run through the LM only once. All the labelings missing
+    from the cache are scored together in a single batched LSTM step per labeling length.
     """
-    result = np.log(np.exp(a) + np.exp(b))
-    return result
+
+    def __init__(self, lm, spaceIx, cacheSize=2048):
+        self.lm = lm
+        self.spaceIx = spaceIx
+        self.cacheSize = cacheSize
+        self.device = next(lm.parameters()).device
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def log_probs(self, labelings):
+        """
+        Function to get the LM log probabilities of the next character (over the LM character set) for every labeling.
+        """
+        entries = dict()
+        missing = list()
+        for labeling in labelings:
+            #the state of a labeling needs the state of its prefix, so the uncached prefixes are scored as well
+            while labeling not in entries:
+                if labeling in self.cache:
+                    self.cache.move_to_end(labeling)
+                    entries[labeling] = self.cache[labeling]
+                    self.hits += 1
+                    break
+                entries[labeling] = None
+                missing.append(labeling)
+                self.misses += 1
+                if len(labeling) == 0:
+                    break
+                labeling = labeling[:-1]
+
+        for length in sorted(set([len(labeling) for labeling in missing])):
+            self.score([labeling for labeling in missing if len(labeling) == length], entries)
+        return [entries[labeling][2] for labeling in labelings]
+
+
+    def score(self, labelings, entries):
+        """
+        Function to run a single LM step for labelings of equal length whose prefixes are already in the entries.
+        The empty labeling starts from the zero state with the space character as the start-of-sequence token.
+        """
+        numLayers, hiddenSize = self.lm.lstm.num_layers, self.lm.lstm.hidden_size
+        zeroState = torch.zeros(numLayers, hiddenSize, device=self.device)
+        inputs = list()
+        hStates = list()
+        cStates = list()
+        for labeling in labelings:
+            if len(labeling) == 0:
+                inputs.append(self.spaceIx-1)
+                hStates.append(zeroState)
+                cStates.append(zeroState)
+            else:
+                prefix = labeling[:-1]
+                entry = entries[prefix]
+                inputs.append(labeling[-1]-1)
+                hStates.append(entry[0])
+                cStates.append(entry[1])
+
+        inputBatch = torch.tensor(inputs, device=self.device).reshape(1,-1)
+        initStateBatch = (torch.stack(hStates, dim=1), torch.stack(cStates, dim=1))
+        with torch.no_grad():
+            outputBatch, (hBatch, cBatch) = self.lm(inputBatch, initStateBatch)
+        logProbs = outputBatch[0].cpu().numpy().astype(np.float64)
+
+        for i, labeling in enumerate(labelings):
+            entry = (hBatch[:,i], cBatch[:,i], logProbs[i])
+            entries[labeling] = entry
+            self.cache[labeling] = entry
+            self.cache.move_to_end(labeling)
+            if len(self.cache) > self.cacheSize:
+                self.cache.popitem(last=False)
+        return
 
 
 
@@ -152,24 +219,32 @@ def ctc_search_decode(outputBatch, inputLenBatch, beamSearchParams, spaceIx, eos
 
     """
     Applies the CTC beam search decoding along with a character-level language model.
+    The beam is kept in arrays indexed by the nodes of a prefix trie. At every time step only the best beamWidth entries
+    are selected (without sorting the whole beam) and the probabilities of equal labelings are merged with a
+    vectorized logsumexp. The language model (a LRS2CharLM or a LMScorer sharing its cache between calls) scores all the
+    new extensions of a time step in a single batched step.
     Note: The probability assigned to <EOS> token is added to the probability of the blank token before decoding
     to avoid <EOS> predictions in middle of transcriptions. Once decoded, <EOS> token is appended at last to the
     predictions for uniformity with targets.
     """
 
+    if lm is not None and not isinstance(lm, LMScorer):
+        lm = LMScorer(lm, spaceIx)
+
     outputBatch = outputBatch.cpu()
     inputLenBatch = inputLenBatch.cpu()
-    outputBatch[:,:,blank] = torch.log(torch.exp(outputBatch[:,:,blank]) + torch.exp(outputBatch[:,:,eosIx]))
+    blankLogProbs = torch.log(torch.exp(outputBatch[:,:,blank]) + torch.exp(outputBatch[:,:,eosIx]))
     reqIxs = np.arange(outputBatch.shape[2])
     reqIxs = reqIxs[reqIxs != eosIx]
     outputBatch = outputBatch[:,:,reqIxs]
+    outputBatch[:,:,blank] = blankLogProbs
 
     beamWidth = beamSearchParams["beamWidth"]
     alpha = beamSearchParams["alpha"]
     beta = beamSearchParams["beta"]
     threshProb = beamSearchParams["threshProb"]
 
-    outLogProbs = outputBatch.transpose(0, 1).numpy()
+    outLogProbs = outputBatch.transpose(0, 1).numpy().astype(np.float64)
     inpLens = inputLenBatch.numpy()
     preds = list()
     predLens = list()
@@ -181,74 +256,78 @@ def ctc_search_decode(outputBatch, inputLenBatch, beamSearchParams, spaceIx, eos
         maxT, maxC = mat.shape
 
         #initializing the main beam with a single entry having empty prediction
-        last = BeamState(alpha, beta)
-        labeling = tuple()
-        last.entries[labeling] = BeamEntry()
-        last.entries[labeling].logPrBlank = 0
-        last.entries[labeling].logPrTotal = 0
+        trie = PrefixTrie()
+        nodes = np.zeros(1, dtype=np.int64)
+        logPrNonBlank = np.full(1, -np.inf)
+        logPrBlank = np.zeros(1)
+        logPrTotal = np.zeros(1)
+        logPrText = np.zeros(1)
 
         #going over all the time steps
         for t in range(maxT):
 
-            #a temporary beam to store all possible predictions (which are extensions of predictions
-            #in the main beam after time step t-1) after time step t
-            curr = BeamState(alpha, beta)
-            #considering only the characters with probability above a certain threshold to speeden up the algo
-            prunedChars = np.where(mat[t,:] > np.log(threshProb))[0]
-
             #keeping only the best predictions in the main beam
-            bestLabelings = last.sort()[:beamWidth]
-
-            #going over all the best predictions
-            for labeling in bestLabelings:
+            best = top_k(beam_scores(trie, nodes, logPrTotal, logPrText, alpha, beta), beamWidth)
+            bestNodes = nodes[best]
+            lastChars = trie.char[bestNodes]
 
-                #same prediction (either blank or last character repeated)
-                if len(labeling) != 0:
-                    logPrNonBlank = last.entries[labeling].logPrNonBlank + mat[t, labeling[-1]]
-                else:
-                    logPrNonBlank = -np.inf
-
-                logPrBlank = last.entries[labeling].logPrTotal + mat[t, blank]
-
-                add_beam(curr, labeling)
-                curr.entries[labeling].labeling = labeling
-                curr.entries[labeling].logPrNonBlank = log_add(curr.entries[labeling].logPrNonBlank, logPrNonBlank)
-                curr.entries[labeling].logPrBlank = log_add(curr.entries[labeling].logPrBlank, logPrBlank)
-                curr.entries[labeling].logPrTotal = log_add(curr.entries[labeling].logPrTotal, log_add(logPrBlank, logPrNonBlank))
-                curr.entries[labeling].logPrText = last.entries[labeling].logPrText
-                curr.entries[labeling].lmApplied = True
-                curr.entries[labeling].lmState = last.entries[labeling].lmState
-
-
-                #extending the best prediction with all characters in the pruned set
-                for c in prunedChars:
-
-                    if c == blank:
-                        continue
-
-                    #extended prediction
-                    newLabeling = labeling + (c,)
-
-                    if (len(labeling) != 0)  and (labeling[-1] == c):
-                        logPrNonBlank = mat[t, c] + last.entries[labeling].logPrBlank
-                    else:
-                        logPrNonBlank = mat[t, c] + last.entries[labeling].logPrTotal
-
-                    add_beam(curr, newLabeling)
-                    curr.entries[newLabeling].labeling = newLabeling
-                    curr.entries[newLabeling].logPrNonBlank = log_add(curr.entries[newLabeling].logPrNonBlank, logPrNonBlank)
-                    curr.entries[newLabeling].logPrTotal = log_add(curr.entries[newLabeling].logPrTotal, logPrNonBlank)
-
-                    #applying language model
-                    if lm is not None:
-                        apply_lm(curr.entries[labeling], curr.entries[newLabeling], spaceIx, lm)
+            #considering only the characters with probability above a certain threshold to speeden up the algo
+            prunedChars = np.flatnonzero(mat[t,:] > np.log(threshProb))
+            prunedChars = prunedChars[prunedChars != blank]
+
+            #same prediction (either blank or last character repeated)
+            sameNonBlank = np.where(lastChars >= 0, logPrNonBlank[best] + mat[t, np.maximum(lastChars, 0)], -np.inf)
+            sameBlank = logPrTotal[best] + mat[t, blank]
+            sameTotal = np.logaddexp(sameBlank, sameNonBlank)
+
+            #extending the best predictions with all characters in the pruned set
+            extNodes = np.array([[trie.child(node, c) for c in prunedChars] for node in bestNodes.tolist()],
+                                dtype=np.int64).reshape(len(best), len(prunedChars))
+            extNonBlank = mat[t, prunedChars][None,:] + np.where(lastChars[:,None] == prunedChars[None,:],
+                                                                 logPrBlank[best][:,None], logPrTotal[best][:,None])
+
+            #the temporary beam lists every prediction followed by its extensions, equal labelings are merged
+            candNodes = np.concatenate([bestNodes[:,None], extNodes], axis=1).ravel()
+            uniqNodes, firstIxs, inverse = np.unique(candNodes, return_index=True, return_inverse=True)
+            order = np.argsort(firstIxs)
+            positions = np.empty_like(order)
+            positions[order] = np.arange(len(order))
+            positions = positions[inverse.ravel()].reshape(len(best), len(prunedChars)+1)
+            nodes = uniqNodes[order]
+
+            logPrNonBlank = np.full(len(nodes), -np.inf)
+            np.logaddexp.at(logPrNonBlank, positions[:,0], sameNonBlank)
+            np.logaddexp.at(logPrNonBlank, positions[:,1:].ravel(), extNonBlank.ravel())
+            newLogPrBlank = np.full(len(nodes), -np.inf)
+            np.logaddexp.at(newLogPrBlank, positions[:,0], sameBlank)
+            newLogPrTotal = np.full(len(nodes), -np.inf)
+            np.logaddexp.at(newLogPrTotal, positions[:,0], sameTotal)
+            np.logaddexp.at(newLogPrTotal, positions[:,1:].ravel(), extNonBlank.ravel())
+
+            #applying language model to the new extensions, the predictions already in the beam keep their scores
+            newLogPrText = np.zeros(len(nodes))
+            if lm is not None:
+                newMask = ~np.isin(extNodes, bestNodes)
+                rows = np.flatnonzero(newMask.any(axis=1))
+                unscored = [node for node in set(bestNodes[rows].tolist()) if trie.lmLogProbs[node] is None]
+                if len(unscored) > 0:
+                    logProbs = lm.log_probs([tuple(trie.labeling(node)) for node in unscored])
+                    for node, nodeLogProbs in zip(unscored, logProbs):
+                        trie.lmLogProbs[node] = nodeLogProbs
+                if len(rows) > 0:
+                    lmLogProbs = np.stack([trie.lmLogProbs[node] for node in bestNodes[rows].tolist()])
+                    extLogPrText = logPrText[best[rows]][:,None] + lmLogProbs[:,prunedChars-1]
+                    rowMask = newMask[rows]
+                    newLogPrText[positions[rows,1:][rowMask]] = extLogPrText[rowMask]
+            newLogPrText[positions[:,0]] = logPrText[best]
 
             #replacing the main beam with the temporary beam having extended predictions
-            last = curr
+            logPrBlank = newLogPrBlank
+            logPrTotal = newLogPrTotal
+            logPrText = newLogPrText
 
         #output the best prediciton
-        bestLabeling = last.sort()[0]
-        bestLabeling = list(bestLabeling)
+        bestLabeling = trie.labeling(nodes[top_k(beam_scores(trie, nodes, logPrTotal, logPrText, alpha, beta), 1)[0]])
         bestLabeling.append(eosIx)
         preds.extend(bestLabeling)
         predLens.append(len(bestLabeling))
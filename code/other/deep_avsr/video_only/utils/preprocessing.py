@@ -8,57 +8,127 @@ https://github.com/lordmartian/deep_avsr
 import cv2 as cv
 import numpy as np
 import torch
-import os
+import subprocess
+import tempfile
 
+from ...cache import cache
 
 
-def preprocess_sample(input, output, params):
+
+def read_roi_frames(videoFile, roiSize):
 
     """
-    Function to preprocess each data sample.
+    Function to read the mouth ROI of every frame of a video file.
+    FFmpeg converts the frames to grayscale, resizes them to 224x224 and crops the central roiSize x roiSize region.
+    The raw uint8 frames are streamed through a pipe straight into a preallocated array, which doubles in size
+    whenever it gets full. Raises a RuntimeError with the FFmpeg error output if the video cannot be decoded or has no
+    frames.
     """
 
-    videoFile = input
-    roiFile = output + ".png"
-    visualFeaturesFile = output + ".npy"
+    command = ["ffmpeg", "-v", "error", "-i", videoFile, "-an",
+               "-vf", "format=gray,scale=224:224:flags=bilinear,crop=%d:%d" %(roiSize, roiSize),
+               "-f", "rawvideo", "-pix_fmt", "gray", "-"]
+    #the error output goes to a file, a pipe that is not read while the frames are could fill up and block FFmpeg
+    errorFile = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errorFile)
+    frames = np.empty((64, roiSize, roiSize), dtype=np.uint8)
+    numFrames = 0
+    while True:
+        if numFrames == len(frames):
+            frames = np.concatenate([frames, np.empty_like(frames)], axis=0)
+        buffer = memoryview(frames[numFrames]).cast("B")
+        numBytes = 0
+        while numBytes < len(buffer):
+            read = process.stdout.readinto(buffer[numBytes:])
+            if not read:
+                break
+            numBytes += read
+        if numBytes < len(buffer):
+            break
+        numFrames += 1
+    process.stdout.close()
+    process.wait()
+    errorFile.seek(0)
+    errors = errorFile.read().decode("utf8", "replace").strip()
+    errorFile.close()
+    if process.returncode != 0 or numFrames == 0:
+        raise RuntimeError("FFmpeg could not read the frames of %s (exit code %d): %s"
+                           %(videoFile, process.returncode, errors or "no video frames"))
+    return frames[:numFrames]
+
+
+
+def run_visual_frontend(vf, inp, windowSize, device):
+
+    """
+    Function to extract the visual features of a frame sequence, passing at most windowSize frames to the visual
+    frontend at once to keep the memory used by the activations bounded.
+    Each window is extended on both sides by the temporal context of the 3D convolution, so the features are the same
+    as when the whole sequence is passed at once.
+    """
+
+    context = vf.frontend3D[0].padding[0]
+    numFrames = len(inp)
+    out = np.empty((numFrames, 512), dtype=np.float32)
+    for start in range(0, numFrames, windowSize):
+        stop = min(start + windowSize, numFrames)
+        left = max(start - context, 0)
+        right = min(stop + context, numFrames)
+        inputBatch = torch.from_numpy(inp[left:right]).to(device)
+        with torch.no_grad():
+            outputBatch = vf(inputBatch)
+        out[start:stop] = outputBatch[start-left:stop-left, 0].cpu().numpy()
+    return out
+
+
+
+def extract_visual_features(roiSequence, params):
+
+    """
+    Function to normalise the mouth ROI frames (uint8) and extract the visual features of every frame.
+    If params contain a "roiFile" path, the strip of the mouth ROIs is saved to it as an image for debugging.
+    If params contain a "frontendKey" (the visual frontend checkpoint hash), the features are kept in the artifact cache
+    under the content of the frames and the normalisation parameters, so they are shared by the video-only and
+    audio-visual modes and computed only once when both process the same frames at the same time.
+    """
 
     roiSize = params["roiSize"]
     normMean = params["normMean"]
     normStd = params["normStd"]
     vf = params["vf"]
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-
-    #for each frame, resize to 224x224 and crop the central 112x112 region
-    captureObj = cv.VideoCapture(videoFile)
-    roiSequence = list()
-    while (captureObj.isOpened()):
-        ret, frame = captureObj.read()
-        if ret == True:
-            grayed = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-            grayed = grayed/255
-            grayed = cv.resize(grayed, (224,224))
-            roi = grayed[int(112-(roiSize/2)):int(112+(roiSize/2)), int(112-(roiSize/2)):int(112+(roiSize/2))]
-            roiSequence.append(roi)
-            # cv.imshow('test', roi)
-            # cv.waitKey(100)
-        else:
-            break
-    captureObj.release()
-    cv.imwrite(roiFile, np.floor(255*np.concatenate(roiSequence, axis=1)).astype(np.int))
+    windowSize = params["windowSize"]
+    roiFile = params.get("roiFile")
+    frontendKey = params.get("frontendKey")
+    device = next(vf.parameters()).device
+
+    if roiFile is not None:
+        cv.imwrite(roiFile, np.concatenate(roiSequence, axis=1))
+
+    def compute():
+        inp = roiSequence.astype(np.float32)/255
+        inp = (inp - np.float32(normMean))/np.float32(normStd)
+        inp = inp.reshape(len(inp), 1, 1, roiSize, roiSize)
+        return run_visual_frontend(vf, inp, windowSize, device)
+
+    if frontendKey is None:
+        return compute()
+    key = cache.key("visual-features", frontendKey, roiSize, normMean, normStd, cache.content_hash(roiSequence))
+    return np.array(cache.get_or_compute_array(key, compute))
+
+
+
+def preprocess_sample(input, params):
+
+    """
+    Function to preprocess each data sample.
+    Returns the visual features of the video without writing any intermediate files.
+    """
+
+    videoFile = input
 
+    #read the frames already converted to grayscale, resized to 224x224 and cropped to the central ROI
+    roiSequence = read_roi_frames(videoFile, params["roiSize"])
 
     #normalise the frames and extract features for each frame using the visual frontend
-    #save the visual features to a .npy file
-    inp = np.stack(roiSequence, axis=0)
-    inp = np.expand_dims(inp, axis=[1,2])
-    inp = (inp - normMean)/normStd
-    inputBatch = torch.from_numpy(inp)
-    inputBatch = (inputBatch.float()).to(device)
-    vf.eval()
-    with torch.no_grad():
-        outputBatch = vf(inputBatch)
-    out = torch.squeeze(outputBatch, dim=1)
-    out = out.cpu().numpy()
-    np.save(visualFeaturesFile, out)
-    return
+    out = extract_visual_features(roiSequence, params)
+    return out
@@ -3,16 +3,20 @@ Record processing
 """
 from PyQt5.QtWidgets import QWidget, QLabel, QPushButton, QGridLayout, QSizePolicy, QStyle
 from PyQt5.Qt import Qt
-from PyQt5.QtCore import QObject, pyqtSignal, QTimer, QElapsedTimer, QMutex, QWaitCondition
-from PyQt5.QtGui import QImage, QCursor, QIcon, QPixmap
+from PyQt5.QtCore import QObject, pyqtSignal, QTimer, QElapsedTimer
+from PyQt5.QtGui import QImage, QCursor, QIcon, QPixmap, QGuiApplication
 from ui_utils import clear_widget, clear_layout, ms_to_time
-from utils import merge
+from utils import merge, SampleRingBuffer, get_from_file, get_live_transcriber, params
 from responsive_svg import SvgWidgetAspect, CustomAudioSvgWidget, ResponsiveIconButton
 import pyaudio
 import wave
+import numpy as np
 import cv2 as cv
 import os
 import shutil
+import queue
+import threading
+import time
 
 
 class MergeProcess(QObject):
@@ -41,6 +45,8 @@ class AudioProcess(QObject):
         self.mic_options_sample_format = pyaudio.paInt16  # 16 bits per sample
         self.mic_options_channels = 1
         self.mic_options_rate = 16000
+        self.mic_options_buffer_len = 30  # seconds of the latest audio kept in memory for live consumers
+        self.buffer = SampleRingBuffer(self.mic_options_buffer_len * self.mic_options_rate)
         self.stream = self.mic.open(
             format=self.mic_options_sample_format,
             channels=self.mic_options_channels,
@@ -51,20 +57,20 @@ class AudioProcess(QObject):
         self.output = output
 
     def run(self):
-        frames = []
-        while self.mic_state:
-            data = self.stream.read(self.mic_options_chunk)
-            frames.append(data)
-        self.stream.stop_stream()
-        self.stream.close()
-        self.mic.terminate()
-        print('audio', len(frames),
-              len(frames) * self.mic_options_chunk / self.mic_options_rate)
+        # every chunk is written to the file as it arrives (the wav header is updated on every write, so the file
+        # stays valid if recording is interrupted) and to the ring buffer read by live consumers
         with wave.open(self.output, 'wb') as wf:
             wf.setnchannels(self.mic_options_channels)
             wf.setsampwidth(self.mic.get_sample_size(self.mic_options_sample_format))
             wf.setframerate(self.mic_options_rate)
-            wf.writeframes(b''.join(frames))
+            while self.mic_state:
+                data = self.stream.read(self.mic_options_chunk, exception_on_overflow=False)
+                wf.writeframes(data)
+                self.buffer.write(np.frombuffer(data, dtype=np.int16))
+        self.stream.stop_stream()
+        self.stream.close()
+        self.mic.terminate()
+        print('audio', self.buffer.total // self.mic_options_chunk, self.buffer.total / self.mic_options_rate)
         self.finished.emit('audio')
 
     def toggle_record(self):
@@ -76,65 +82,135 @@ class AudioProcess(QObject):
     def get_output(self):
         return self.output
 
+    def get_buffer(self):
+        return self.buffer
+
     def destroy(self):
         self.mic_state = False
 
 
+class LiveProcess(QObject):
+    finished = pyqtSignal(str)
+    progress = pyqtSignal(str)
+
+    def __init__(self, buffer):
+        super().__init__()
+        self.buffer = buffer
+        self.state = True
+
+    def run(self):
+        # the recorded samples are transcribed window by window while recording, the text is emitted when it changes
+        transcriber = get_live_transcriber()
+        text = ''
+        while self.state:
+            pred = transcriber.update(self.buffer)
+            if pred != text:
+                text = pred
+                self.progress.emit(text)
+            time.sleep(0.05)
+        self.finished.emit('live')
+
+    def destroy(self):
+        self.state = False
+
+
 class VideoProcess(QObject):
     finished = pyqtSignal(str)
-    progress = pyqtSignal(QImage)
 
-    def __init__(self, output, mutex, cond):
+    def __init__(self, output, downscale=False):
         super().__init__()
         self.cam = cv.VideoCapture(0)
         self.cam.set(3, 1200)
         self.cam.set(4, 1200)
         self.cam_state = True
         self.recorder_state = False
-        self.mutex = mutex
-        self.cond = cond
+        # latest captured frame for the preview, the GUI takes it at its own pace so older frames are dropped
+        self.preview = None
+        self.preview_lock = threading.Lock()
         self.timer = QElapsedTimer()
         self.duration = 0
         self.output = output
+        self.fps = params['VIDEO_FPS']  # the recording is written at the frame rate the models expect
+        # frames are downscaled to the model input resolution while recording if requested
+        self.size = (int(params['VIDEO_WIDTH']), int(params['VIDEO_HEIGHT'])) if downscale else None
+        self.queue = queue.Queue(maxsize=64)  # frames waiting for the encoder, bounds the memory used by recording
+        self.dropped = 0  # frames dropped because the encoder fell behind, the previous frame is repeated in their slots
+        self.record_start = None
+        self.record_stop = None
 
     def run(self):
-        frames = []
+        encoder = threading.Thread(target=self.encode)
+        encoder.start()
         while self.cam_state:
             ret, frame = self.cam.read()
+            timestamp = time.perf_counter()
             if ret:
                 frame = cv.flip(frame, 1)
-                frame_process = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
-                height, width, channel = frame_process.shape
-                step = channel * width
-                img = QImage(frame_process.data, width, height, step, QImage.Format_RGB888)
-                self.progress.emit(img)
-                self.cond.wait(self.mutex)
+                with self.preview_lock:
+                    self.preview = frame
                 if self.recorder_state:
-                    frames.append(frame)
-        fps = len(frames) / (self.duration / 1000)
-        print('video', len(frames), len(frames) / fps, fps)
-        recorder = cv.VideoWriter(self.output, cv.VideoWriter_fourcc('m', 'p', '4', 'v'), fps,
-                                  (int(self.cam.get(3)), int(self.cam.get(4))))
+                    if self.size is not None:
+                        frame = cv.resize(frame, self.size, interpolation=cv.INTER_AREA)
+                    # the capture never waits for the encoder, a frame that does not fit in the queue is dropped
+                    try:
+                        self.queue.put_nowait((timestamp, frame))
+                    except queue.Full:
+                        self.dropped += 1
+        self.queue.put((self.record_stop, None))
+        encoder.join()
         if self.cam.isOpened():
             self.cam.release()
-        for frame in frames:
-            recorder.write(frame)
-        recorder.release()
         self.finished.emit('video')
 
+    def encode(self):
+        # writes the recording at a constant frame rate as the frames arrive: every frame is shown from its capture
+        # time until the capture time of the next one, so it is repeated or dropped to fill the output frame slots
+        recorder = None
+        previous = None
+        written = 0
+        while True:
+            timestamp, frame = self.queue.get()
+            if previous is not None:
+                slots = int(np.ceil((timestamp - self.record_start) * self.fps))
+                if frame is None:
+                    slots = max(slots, written + 1)
+                while written < slots:
+                    recorder.write(previous)
+                    written += 1
+            if frame is None:
+                break
+            if recorder is None:
+                height, width = frame.shape[:2]
+                recorder = cv.VideoWriter(self.output, cv.VideoWriter_fourcc('m', 'p', '4', 'v'), self.fps,
+                                          (width, height))
+            previous = frame
+        if recorder is not None:
+            recorder.release()
+        print('video', written, written / self.fps, self.fps, self.dropped)
+
     def toggle_record(self):
         if self.recorder_state:
             self.duration = self.timer.elapsed()
+            self.record_stop = time.perf_counter()
             self.recorder_state = False
             self.cam_state = False
         else:
             self.timer.start()
+            self.record_start = time.perf_counter()
             self.recorder_state = True
 
     def get_output(self):
         return self.output
 
+    def get_preview(self):
+        # latest captured frame, None if no frame has been captured since the previous call
+        with self.preview_lock:
+            frame, self.preview = self.preview, None
+        return frame
+
     def destroy(self):
+        if self.record_stop is None:
+            self.record_stop = time.perf_counter()
         self.cam_state = False
         self.recorder_state = False
 
@@ -164,9 +240,14 @@ class RecordWidget(QWidget):
         self.worker_audio = None
         self.thread_video = None
         self.thread_audio = None
-        self.mutex = QMutex()
-        self.cond = QWaitCondition()
+        self.worker_live = None
+        self.thread_live = None
+        self.live_text = QLabel(parent=self.area)
+        self.live_text.setWordWrap(True)
+        self.live_text.setVisible(False)
         self.timer_audio = QTimer()
+        self.timer_preview = QTimer(parent=self)
+        self.timer_preview.timeout.connect(self.update_preview)
 
     def render_default(self):
         clear_layout(self.area_layout)
@@ -230,17 +311,20 @@ class RecordWidget(QWidget):
         self.area_layout.addWidget(self.record_timer_text, 1, 0, 1, 1)
         self.area_layout.addWidget(self.viewfinder, 0, 1, 3, 4)
         self.area_layout.addWidget(self.record_toggle_button, 1, 5, 1, 1)
+        self.area_layout.addWidget(self.live_text, 3, 1, 1, 4)
         self.area.setLayout(self.area_layout)
         if self.worker_video is None:
-            self.mutex.lock()
-            self.worker_video = VideoProcess('temp/record_video.mp4', self.mutex, self.cond)
+            downscale = get_from_file('config.txt', 'Downscale record').get('Downscale record') == 'True'
+            self.worker_video = VideoProcess('temp/record_video.mp4', downscale)
             self.thread_video = self.parent().parent().create_thread()
             self.worker_video.moveToThread(self.thread_video)
             self.thread_video.started.connect(self.worker_video.run)
-            self.worker_video.progress.connect(self.update_pixmap)
             self.worker_video.finished.connect(self.preprocess)
             self.worker_video.finished.connect(self.thread_video.quit)
+            self.worker_video.finished.connect(self.timer_preview.stop)
         self.thread_video.start()
+        # the preview is refreshed at most at the display refresh rate
+        self.timer_preview.start(int(1000 / (QGuiApplication.primaryScreen().refreshRate() or 60)))
 
     def render_record_audio(self):
         clear_layout(self.area_layout, delete=True)
@@ -249,6 +333,7 @@ class RecordWidget(QWidget):
         self.record_toggle_button.setCursor(QCursor(Qt.PointingHandCursor))
         self.area_layout.addWidget(self.record_toggle_button, 0, 0, 1, 1, Qt.AlignCenter)
         self.area_layout.addWidget(self.record_timer_text, 1, 0, 1, 1, Qt.AlignCenter)
+        self.area_layout.addWidget(self.live_text, 2, 0, 1, 1, Qt.AlignCenter)
         self.area.setLayout(self.area_layout)
         self.timer_audio.timeout.connect(self.update_svg_circle)
         self.timer_audio.start(10)
@@ -268,6 +353,16 @@ class RecordWidget(QWidget):
             self.thread_audio.started.connect(self.worker_audio.run)
             self.worker_audio.finished.connect(self.preprocess)
             self.worker_audio.finished.connect(self.thread_audio.quit)
+        if self.worker_live is None and get_from_file('config.txt', 'Live transcription').get(
+                'Live transcription') == 'True':
+            self.worker_live = LiveProcess(self.worker_audio.get_buffer())
+            self.thread_live = self.parent().parent().create_thread()
+            self.worker_live.moveToThread(self.thread_live)
+            self.thread_live.started.connect(self.worker_live.run)
+            self.worker_live.progress.connect(self.live_text.setText)
+            self.worker_live.finished.connect(self.thread_live.quit)
+            self.live_text.setVisible(True)
+            self.thread_live.start()
         self.toggle_record()
         if self.record_type == 'video':
             self.record_toggle_button.setEnabled(False)
@@ -278,6 +373,8 @@ class RecordWidget(QWidget):
 
     def stop_record(self):
         self.record_repeater.stop()
+        if self.worker_live is not None:
+            self.worker_live.destroy()
         if self.record_type == 'audio':
             self.timer_audio.stop()
         self.toggle_record()
@@ -328,12 +425,16 @@ class RecordWidget(QWidget):
         self.record_toggle_button.set_background_offset(current_offset + self.svg_circle_inc)
         self.record_toggle_button.update()
 
-    def update_pixmap(self, img):
-        self.mutex.lock()
+    def update_preview(self):
+        frame = self.worker_video.get_preview()
+        if frame is None:
+            return
+        frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+        height, width, channel = frame.shape
+        step = channel * width
+        img = QImage(frame.data, width, height, step, QImage.Format_RGB888)
         self.viewfinder.setPixmap(
             QPixmap.fromImage(img).scaled(self.viewfinder.width(), self.viewfinder.height(), Qt.KeepAspectRatio))
-        self.mutex.unlock()
-        self.cond.wakeAll()
 
     def update_time(self):
         if self.record_type == 'video':
@@ -346,14 +447,19 @@ class RecordWidget(QWidget):
         self.record_timer_text.setText(time_str)
 
     def destroy(self):
+        self.timer_preview.stop()
         if self.worker_video:
             self.worker_video.destroy()
         if self.worker_audio:
             self.worker_audio.destroy()
+        if self.worker_live:
+            self.worker_live.destroy()
         if self.thread_video:
             self.thread_video.quit()
         if self.thread_audio:
             self.thread_audio.quit()
+        if self.thread_live:
+            self.thread_live.quit()
 
     def resizeEvent(self, e):
         self.area.setFixedSize(self.width(), self.height())
@@ -9,7 +9,8 @@ from PyQt5.QtCore import QTimer, QSize, QRectF, QObject, pyqtSignal, QRegExp
 from PyQt5.QtSvg import QSvgRenderer
 from ui_utils import resize_font
 from responsive_svg import ResponsiveIconButton
-from utils import predict, process_convert, compute_wer, get_from_file, change_file
+from utils import compute_wer, get_from_file, change_file
+from scheduler import scheduler
 import pandas as pd
 import openpyxl
 import docx
@@ -49,17 +50,24 @@ class LoadingScreen(QWidget):
 
 class ResultProcess(QObject):
     finished = pyqtSignal(dict, str)
+    file_finished = pyqtSignal(str, str, str)
+    file_failed = pyqtSignal(str, str, str)
+    partial_result = pyqtSignal(str, str, str)
+    progress = pyqtSignal(float, float, str)
 
-    def __init__(self, files, mode, SNR):
+    def __init__(self, files, config):
         super().__init__()
         self.files = files
-        self.mode = mode
-        self.SNR = SNR
+        self.mode = config.mode
+        self.config = config
 
     def process(self):
-        # preprocess - dictionary {file: [filepath, filepath]}
-        preprocess = process_convert(self.files, self.mode, self.SNR)
-        result = predict(preprocess, self.mode)
+        # files are preprocessed in parallel and transcribed one after another, each one is reported when done
+        result = scheduler.run(self.files, self.config,
+                               lambda file, pred: self.file_finished.emit(file, pred, self.mode),
+                               lambda file, text: self.partial_result.emit(file, text, self.mode),
+                               lambda fraction, eta: self.progress.emit(fraction, eta, self.mode),
+                               lambda file, error: self.file_failed.emit(file, error, self.mode))
         print(result)
         # return {file: result}
         self.finished.emit(result, self.mode)
@@ -86,8 +94,12 @@ class ResultWidget(QWidget):
         self.file_area_text.setAlignment(Qt.AlignCenter)
         self.file_area_layout.addWidget(self.file_area_text, 0, 0, 1, 1)
         self.file_area_obj = []
+        self.file_area_map = dict()
+        # files are shown as soon as processing starts, a None result is filled in when it arrives
+        self.progress = dict()
         for i, (file, res) in enumerate(result.items()):
             self.file_area_obj.append(FileIconResult(file, res[0], res[1], parent=self.file_area_widget))
+            self.file_area_map[file] = self.file_area_obj[-1]
             temp = self.file_area_obj[-1]
             temp.setCursor(QCursor(Qt.PointingHandCursor))
             temp.clicked.connect(lambda _, arg=temp: self.show_result(arg))
@@ -119,13 +131,65 @@ class ResultWidget(QWidget):
         self.update_export()
         self.current_obj.click()
 
+    def start(self, files, config):
+        parent = self.parent().parent()
+        thread = parent.create_thread()
+        worker = ResultProcess(files, config)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.process)
+        worker.partial_result.connect(self.update_result)
+        worker.file_finished.connect(self.finish_result)
+        worker.file_failed.connect(self.fail_result)
+        worker.progress.connect(self.update_progress)
+        worker.finished.connect(thread.quit)
+        # the worker lives as long as its thread, even if the result screen is closed before it finishes
+        thread.worker = worker
+        self.progress[config.mode] = (0.0, -1, len(files))
+        thread.start()
+
+    def update_result(self, file, text, mode):
+        widget = self.file_area_map[file]
+        widget.setResult(text, False)
+        if widget is self.current_obj:
+            self.show_result(widget)
+
+    def finish_result(self, file, text, mode):
+        widget = self.file_area_map[file]
+        widget.setResult(text, True)
+        self.update_export()
+        if widget is self.current_obj:
+            self.show_result(widget)
+
+    def fail_result(self, file, error, mode):
+        widget = self.file_area_map[file]
+        widget.setError(error)
+        self.update_export()
+        if widget is self.current_obj:
+            self.show_result(widget)
+
+    def update_progress(self, fraction, eta, mode):
+        self.progress[mode] = (fraction, eta, self.progress[mode][2])
+        total = sum(files for _, _, files in self.progress.values())
+        done = sum(fraction * files for fraction, _, files in self.progress.values()) / total
+        if done >= 1:
+            self.file_area_text.setText('Files')
+            return
+        etas = [eta for _, eta, _ in self.progress.values()]
+        eta = 'ETA ..' if min(etas) < 0 else f'ETA {int(max(etas)) // 60}:{int(max(etas)) % 60:02d}'
+        self.file_area_text.setText(f'Files {int(done * 100)}% {eta}')
+
     def show_result(self, widget):
         self.current_obj = widget
         self.result_display.clear()
         self.result_display.append('Result')
         self.result_display.setAlignment(Qt.AlignCenter)
         self.result_display.append('')
-        self.result_display.append(self.current_obj.getResult())
+        if self.current_obj.getError() is not None:
+            self.result_display.append(f'Error: {self.current_obj.getError()}')
+        else:
+            self.result_display.append(self.current_obj.getResult())
+        if not self.current_obj.isFinished():
+            self.result_display.append('..')
         self.result_display.setAlignment(Qt.AlignLeft)
         self.wer_input_area.setText(self.current_obj.getWER())
 
@@ -133,7 +197,7 @@ class ResultWidget(QWidget):
         self.current_obj.setOriginal(self.wer_input_area.text().strip())
         original_text = self.current_obj.getOriginal()
         pred_text = self.current_obj.getResult()
-        if len(original_text) > 0 and len(pred_text) > 0:
+        if len(original_text) > 0 and len(pred_text) > 0 and self.current_obj.isFinished():
             wer = compute_wer(original_text, pred_text)
             data = get_from_file('data.txt', '')
             mode = self.current_obj.getFiletype()
@@ -189,10 +253,12 @@ class FileIconResult(QPushButton):
         self.file = file
         self.filename = ''.join(file.split('\\')[-1])
         self.wer = None
+        self.error = None  # why the file could not be transcribed, None if it was
         self.text_font = None
         self.filetype = filetype
         self.original = ''
-        self.result = result
+        self.finished = result is not None
+        self.result = result if result is not None else ''
         # self.word_limit = 12
         self.word_limit = len(self.filename)
         self.current_pos = 0
@@ -219,6 +285,21 @@ class FileIconResult(QPushButton):
     def getResult(self):
         return self.result
 
+    def setResult(self, result, finished):
+        self.result = result
+        self.finished = finished
+        self.update()
+
+    def isFinished(self):
+        return self.finished
+
+    def getError(self):
+        return self.error
+
+    def setError(self, error):
+        self.error = error
+        self.setResult('', True)
+
     def getWER(self):
         return self.wer
 
@@ -246,7 +327,7 @@ class FileIconResult(QPushButton):
         painter.begin(self)
         path = QPainterPath()
         path.addRoundedRect(0, 0, self.width(), self.height(), 15, 15)
-        painter.fillPath(path, QColor('#454545'))
+        painter.fillPath(path, QColor('#454545' if self.finished else '#383838'))
         if self.filetype != 'audio-only':
             svg = QSvgRenderer('../assets/video_file_icon.svg')
         else:
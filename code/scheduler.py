@@ -0,0 +1,238 @@
+"""
+Scheduling of multi-file transcription jobs
+"""
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from utils import preprocess_file, predict, get_cache, get_transcript_key, get_from_file, get_cached_chunks, \
+    set_chunk_keys
+
+
+class Job:
+    """
+    transcription of a group of files with the same model configuration
+    """
+
+    def __init__(self, files, config, callback, partial=None, progress=None, error=None):
+        """
+        :param files (list(str)): filepaths
+        :param config (InferenceConfig): model configuration
+        :param callback (callable): called with (file, prediction) as soon as a file is transcribed
+        :param partial (callable): called with (file, transcript of the chunks decoded so far) during inference
+        :param progress (callable): called with (done fraction, estimated remaining time in seconds or -1 if unknown)
+        :param error (callable): called with (file, error message) when a file cannot be transcribed
+        """
+        self.config = config
+        self.callback = callback
+        self.error = error
+        self.partial = partial
+        self.progress = progress
+        self.result = dict()
+        # done fraction of every file, preprocessing counts as half of the work
+        self.fractions = dict.fromkeys(files, 0.0)
+        self.start = time.perf_counter()
+        self.remaining = len(files)
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        if self.remaining == 0:
+            self.done.set()
+
+    def report(self, file, fraction):
+        """
+        updates the done fraction of a file and reports the job progress
+        :param file (str): filepath
+        :param fraction (float): done fraction of the file
+        :return (void):
+        """
+        with self.lock:
+            self.fractions[file] = fraction
+            done = sum(self.fractions.values()) / len(self.fractions)
+        elapsed = time.perf_counter() - self.start
+        if self.progress is not None:
+            self.progress(done, elapsed * (1 - done) / done if done > 0 else -1)
+
+    def preprocessed(self, file):
+        """
+        records that a file is preprocessed
+        :param file (str): filepath
+        :return (void):
+        """
+        self.report(file, 0.5)
+
+    def decoded(self, file, text, chunks, total):
+        """
+        records that chunks of a file are decoded and reports the partial transcript
+        :param file (str): filepath
+        :param text (str): transcript of the decoded chunks
+        :param chunks (int): number of decoded chunks
+        :param total (int): number of chunks
+        :return (void):
+        """
+        if self.partial is not None:
+            self.partial(file, text)
+        self.report(file, 0.5 + 0.5 * chunks / total)
+
+    def finish(self, file, pred):
+        """
+        records and reports the prediction of a file
+        :param file (str): filepath
+        :param pred (str): prediction
+        :return (void):
+        """
+        self.callback(file, pred)
+        self.complete(file, pred)
+
+    def fail(self, file, error):
+        """
+        records and reports the failure of a file, its prediction is empty
+        :param file (str): filepath
+        :param error (Exception): error
+        :return (void):
+        """
+        print(f'transcribing {file} failed: {error}')
+        if self.error is not None:
+            self.error(file, str(error) or type(error).__name__)
+        self.complete(file, '')
+
+    def complete(self, file, pred):
+        """
+        records the prediction of a file and the job progress
+        :param file (str): filepath
+        :param pred (str): prediction
+        :return (void):
+        """
+        with self.lock:
+            self.result[file] = pred
+            self.remaining -= 1
+        self.report(file, 1.0)
+        if self.remaining == 0:
+            self.done.set()
+
+
+class Scheduler:
+    """
+    runs transcription jobs: files are decoded and split in a bounded pool of worker processes, while a single
+    inference thread runs the models on the files as they become ready, so preprocessing of the next files overlaps
+    inference of the previous ones
+    """
+
+    def __init__(self, workers=2):
+        """
+        :param workers (int): number of preprocessing worker processes
+        """
+        self.workers = workers
+        self.pool = None
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        # number of files submitted for preprocessing but not yet transcribed, bounds the memory held by decoded chunks
+        self.in_flight = 0
+        self.slots = threading.Condition()
+
+    def start(self, workers):
+        """
+        creates the preprocessing pool (again if the number of workers has changed) and the inference thread
+        :param workers (int): number of preprocessing worker processes
+        :return (void):
+        """
+        with self.lock:
+            if self.pool is None or workers != self.workers:
+                if self.pool is not None:
+                    self.pool.shutdown(wait=False)
+                self.workers = workers
+                self.pool = ProcessPoolExecutor(max_workers=workers)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.infer, daemon=True)
+                self.thread.start()
+
+    def run(self, files, config, callback=lambda file, pred: None, partial=None, progress=None, error=None):
+        """
+        transcribes files, blocks until all of them are done
+        transcriptions of already processed files are taken from the cache, files whose chunks all have cached log
+        probabilities are only decoded again, without preprocessing
+        :param files (list(str)): filepaths
+        :param config (InferenceConfig): model configuration
+        :param callback (callable): called with (file, prediction) as soon as a file is transcribed
+        :param partial (callable): called with (file, transcript of the chunks decoded so far) during inference
+        :param progress (callable): called with (done fraction, estimated remaining time in seconds or -1 if unknown)
+        :param error (callable): called with (file, error message) when a file cannot be transcribed
+        :return (dict(str:str)): prediction result, empty for the files that failed
+        """
+        settings = get_from_file('config.txt', 'Workers')
+        self.start(int(settings['Workers']) if 'Workers' in settings else self.workers)
+        cache = get_cache()
+        job = Job(files, config, callback, partial, progress, error)
+        for file in files:
+            key = get_transcript_key(file, config)
+            pred = cache.get(key)
+            if pred is not None:
+                job.finish(file, pred)
+                continue
+            chunks = get_cached_chunks(file, config)
+            if chunks is not None:
+                with self.slots:
+                    self.in_flight += 1
+                future = Future()
+                future.set_result(chunks)
+                self.queue.put((job, file, key, future))
+                continue
+            with self.slots:
+                while self.in_flight >= 2 * self.workers:
+                    self.slots.wait()
+                self.in_flight += 1
+            future = self.pool.submit(preprocess_file, file, config.mode, config.video_snr)
+            future.add_done_callback(lambda future, file=file, key=key: self.queue.put((job, file, key, future)))
+        job.done.wait()
+        return job.result
+
+    def release(self):
+        """
+        frees the slot of a transcribed file
+        :return (void):
+        """
+        with self.slots:
+            self.in_flight -= 1
+            self.slots.notify_all()
+
+    def infer(self):
+        """
+        inference thread loop, the files preprocessed by the time the models are free are predicted together
+        :return (void):
+        """
+        cache = get_cache()
+        while True:
+            items = [self.queue.get()]
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            ready = OrderedDict()
+            for job, file, key, future in items:
+                try:
+                    file_chunks = future.result()
+                    set_chunk_keys(file, file_chunks, job.config)
+                    ready.setdefault(job, OrderedDict())[file] = (key, file_chunks)
+                    job.preprocessed(file)
+                except Exception as e:
+                    self.release()
+                    job.fail(file, e)
+            for job, chunks in ready.items():
+                try:
+                    pred = predict({file: file_chunks for file, (_, file_chunks) in chunks.items()}, job.config.mode,
+                                   job.config, job.decoded)
+                except Exception as e:
+                    for file in chunks:
+                        self.release()
+                        job.fail(file, e)
+                    continue
+                for file, (key, _) in chunks.items():
+                    self.release()
+                    if file in pred:
+                        cache.put(key, pred[file])
+                    job.finish(file, pred.get(file, ''))
+
+
+scheduler = Scheduler()
@@ -1,11 +1,11 @@
 from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QComboBox, QLineEdit, QGridLayout, QCheckBox, \
-    QSizePolicy
+    QSizePolicy, QLabel, QPushButton
 from PyQt5.Qt import Qt
 from PyQt5.QtGui import QPainter, QPainterPath, QColor, QPen, QCursor
 from PyQt5.QtCore import QRectF, QSizeF, pyqtSignal
 from PyQt5.QtSvg import QSvgRenderer
 from ui_utils import resize_font
-from utils import change_file, get_from_file
+from utils import change_file, get_from_file, get_cache, get_model_stats
 
 
 class CustomComboBox(QComboBox):
@@ -159,12 +159,45 @@ class SettingsWidget(QWidget):
         self.combo_video.item_changed.connect(self.change_config)
         self.combo_video.addItem('0')
         self.combo_video.addItem('100')
+        self.combo_cache = CustomComboBox('Cache size', 'Cache', parent=self)
+        self.combo_cache.item_changed.connect(self.change_config)
+        self.combo_cache.addItem('256')
+        self.combo_cache.addItem('1024')
+        self.combo_cache.addItem('4096')
+        self.combo_workers = CustomComboBox('Workers', 'Processing', parent=self)
+        self.combo_workers.item_changed.connect(self.change_config)
+        self.combo_workers.addItem('1')
+        self.combo_workers.addItem('2')
+        self.combo_workers.addItem('4')
+        self.combo_workers.addItem('8')
+        self.cache_stats = QLabel(parent=self)
+        self.cache_stats.setStyleSheet('color: #FFFFFF;')
+        self.model_stats = QLabel(parent=self)
+        self.model_stats.setStyleSheet('color: #FFFFFF;')
+        self.cache_clear = QPushButton('Clear cache', parent=self)
+        self.cache_clear.setStyleSheet('QPushButton{background-color: #292929; color: #FFFFFF; border-radius: 15px;}'
+                                       'QPushButton:hover{background-color: #363636;}')
+        self.cache_clear.setCursor(QCursor(Qt.PointingHandCursor))
+        self.cache_clear.clicked.connect(self.clear_cache)
         self.check_noise = QCheckBox('Use noise', parent=self)
         self.check_noise.stateChanged.connect(lambda state: self.change_config(self.check_noise.text(), bool(state)))
         self.check_noise.setCursor(QCursor(Qt.PointingHandCursor))
         self.check_lm = QCheckBox('Use LM', parent=self)
         self.check_lm.stateChanged.connect(lambda state: self.change_config(self.check_lm.text(), bool(state)))
         self.check_lm.setCursor(QCursor(Qt.PointingHandCursor))
+        self.check_downscale = QCheckBox('Downscale record', parent=self)
+        config = get_from_file('config.txt', 'Downscale record')
+        self.check_downscale.setChecked(config.get('Downscale record') == 'True')
+        self.check_downscale.stateChanged.connect(
+            lambda state: self.change_config(self.check_downscale.text(), bool(state)))
+        self.check_downscale.setCursor(QCursor(Qt.PointingHandCursor))
+        self.check_downscale.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self.check_live = QCheckBox('Live transcription', parent=self)
+        config = get_from_file('config.txt', 'Live transcription')
+        self.check_live.setChecked(config.get('Live transcription') == 'True')
+        self.check_live.stateChanged.connect(lambda state: self.change_config(self.check_live.text(), bool(state)))
+        self.check_live.setCursor(QCursor(Qt.PointingHandCursor))
+        self.check_live.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
         self.check_noise.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
         self.check_lm.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
         self.area_layout.addWidget(self.combo_res, 0, 0, 4, 1)
@@ -173,14 +206,47 @@ class SettingsWidget(QWidget):
         self.area_layout.addWidget(self.check_lm, 4, 2, 2, 1)
         self.area_layout.addWidget(self.combo_audio, 8, 1, 4, 1)
         self.area_layout.addWidget(self.combo_video, 12, 1, 4, 1)
+        self.area_layout.addWidget(self.combo_cache, 16, 0, 4, 1)
+        self.area_layout.addWidget(self.cache_stats, 16, 1, 2, 1)
+        self.area_layout.addWidget(self.cache_clear, 16, 2, 2, 1)
+        self.area_layout.addWidget(self.model_stats, 18, 1, 2, 2)
+        self.area_layout.addWidget(self.combo_workers, 20, 0, 4, 1)
+        self.area_layout.addWidget(self.check_downscale, 20, 1, 2, 1)
+        self.area_layout.addWidget(self.check_live, 20, 2, 2, 1)
         self.setLayout(self.area_layout)
         self.check_active()
 
     def check_active(self):
         config = get_from_file('config.txt', '')
-        for i in [self.combo_res, self.combo_dec, self.combo_audio, self.combo_video]:
+        for i in [self.combo_res, self.combo_dec, self.combo_audio, self.combo_video, self.combo_cache,
+                  self.combo_workers]:
             i.setCurrentIndex(i.findText(config[i.get_title()]))
 
     def change_config(self, param, param_val):
         if change_file('config.txt', param, param_val):
-            self.config_changed.emit()
\ No newline at end of file
+            self.config_changed.emit()
+            self.update_cache_stats()
+
+    def update_cache_stats(self):
+        stats = get_cache().stats()
+        self.cache_stats.setText(f'{stats["entries"]} entries, '
+                                 f'{stats["size"] / 2 ** 20:.1f} / {stats["max_size"] / 2 ** 20:.0f} MB\n'
+                                 f'hits: {stats["hits"]}, misses: {stats["misses"]}')
+
+    def update_model_stats(self):
+        stats = get_model_stats()
+        if len(stats) == 0:
+            self.model_stats.setText('no model loaded')
+            return
+        self.model_stats.setText('\n'.join(f'{name}: loaded in {entry["load_time"]:.1f} s, '
+                                           f'{entry["memory"] / 2 ** 20:.0f} MB on {entry["device"]}'
+                                           for name, entry in stats.items()))
+
+    def clear_cache(self):
+        get_cache().clear()
+        self.update_cache_stats()
+
+    def showEvent(self, e):
+        self.update_cache_stats()
+        self.update_model_stats()
+        super().showEvent(e)
\ No newline at end of file
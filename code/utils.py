@@ -1,14 +1,16 @@
 import ffmpeg
+import bisect
 from argparse import ArgumentParser
-from pydub import AudioSegment
 import torch.tensor
 import os
 import numpy as np
-import cv2 as cv
-import shutil
-from other.deep_avsr.audio_only.util import predict as pred_audio_only
+import threading
+from other.deep_avsr.audio_only.util import predict as pred_audio_only, live_transcriber
 from other.deep_avsr.video_only.util import predict as pred_video_only
 from other.deep_avsr.audio_visual.util import predict as pred_audio_video
+from other.deep_avsr.inference_config import InferenceConfig
+from other.deep_avsr.cache import cache
+from other.deep_avsr.registry import registry
 from other.deep_avsr.audio_visual.config import args
 from other.deep_avsr.audio_visual.utils.metrics import compute_wer as get_wer
 
@@ -16,6 +18,8 @@ params = {
     'INPUT_FORMAT': 'mp4',
     'MIN_SILENCE_LEN': 1000,
     'SILENCE_THRESHOLD': -30,
+    'SILENCE_HYSTERESIS': 3,
+    'VAD_FRAME_LEN': 0.010,
     'MIN_SPLIT_LEN': 6,
     'OUTPUT_FORMAT': 'mp4',
     'SILENCE_BUFFER': 0.250,
@@ -26,45 +30,137 @@ params = {
     'PRESET': 'slower',
     'AUDIO_CHANNELS': 1,
     'AUDIO_SAMPLE_RATE': 16000,
-    'AUDIO_CODEC': 'aac'
+    'AUDIO_CODEC': 'aac',
+    'NOISE_SEED': 0,
+    'NOISE_BLOCK_SIZE': 256
 }
+# filepath - ((mtime, size), metadata) of every probed file
+probe_cache = dict()
+probe_lock = threading.Lock()
 
 
-def check_streams(filepath):
+def probe(filepath):
     """
-    checks for the presence of an audio and video channel
+    gets the metadata of a file, running ffprobe only once for as long as the file stays unchanged
     :param filepath (str): filepath
-    :return (bool): audio and video channel status
+    :return (dict(str:bool or float or list)): audio and video channel presence, duration (s), fps, width, height and
+    keyframe times (filled in by probe_video), None if unknown; a copy that callers may modify
     """
-    check_video = False
-    check_audio = False
+    metadata = {'audio': False, 'video': False, 'duration': None, 'fps': None, 'width': None, 'height': None,
+                'keyframes': None}
     try:
-        check_stream = ffmpeg.probe(filepath)
-        for i in check_stream['streams']:
-            if i['codec_type'] == 'video':
-                check_video = True
+        stat = os.stat(filepath)
+    except OSError:
+        return metadata
+    path = os.path.abspath(filepath)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with probe_lock:
+        if path in probe_cache and probe_cache[path][0] == stamp:
+            return dict(probe_cache[path][1])
+    try:
+        info = ffmpeg.probe(filepath)
+        if 'duration' in info['format']:
+            metadata['duration'] = float(info['format']['duration'])
+        for i in info['streams']:
+            if i['codec_type'] == 'video' and not metadata['video']:
+                metadata['video'] = True
+                metadata['width'] = i.get('width')
+                metadata['height'] = i.get('height')
+                num, den = i.get('avg_frame_rate', '0/0').split('/')
+                if float(den) != 0:
+                    metadata['fps'] = float(num) / float(den)
             if i['codec_type'] == 'audio':
-                check_audio = True
+                metadata['audio'] = True
+            if metadata['duration'] is None and 'duration' in i:
+                metadata['duration'] = float(i['duration'])
     except ffmpeg.Error:
         pass
-    return check_audio, check_video
+    with probe_lock:
+        probe_cache[path] = (stamp, metadata)
+    return dict(metadata)
 
 
-def get_chunk_times_audio(filepath):
+def check_streams(filepath):
     """
-    splits an audio file into chunks
+    checks for the presence of an audio and video channel
     :param filepath (str): filepath
+    :return (bool): audio and video channel status
+    """
+    metadata = probe(filepath)
+    return metadata['audio'], metadata['video']
+
+
+def detect_silence(audio):
+    """
+    finds silent regions in audio using framewise RMS with hysteresis thresholds
+    a frame becomes silent when its level drops below SILENCE_THRESHOLD (relative to the whole audio level) and stays
+    silent until the level exceeds the threshold raised by SILENCE_HYSTERESIS
+    :param audio (np.ndarray): mono int16 samples at AUDIO_SAMPLE_RATE
+    :return list(list(float, float)): silent regions of at least MIN_SILENCE_LEN in seconds
+    """
+    rate = params['AUDIO_SAMPLE_RATE']
+    frame_len = int(rate * params['VAD_FRAME_LEN'])
+    num_frames = len(audio) // frame_len
+    if num_frames == 0:
+        return []
+    frames = audio[:num_frames * frame_len].reshape(num_frames, frame_len)
+    power = np.empty(num_frames, dtype=np.float32)
+    block = 4096
+    for i in range(0, num_frames, block):
+        power[i:i + block] = np.square(frames[i:i + block], dtype=np.float32).mean(axis=1)
+    level = power.mean(dtype=np.float64)
+    low = level * 10 ** (params['SILENCE_THRESHOLD'] / 10)
+    high = level * 10 ** ((params['SILENCE_THRESHOLD'] + params['SILENCE_HYSTERESIS']) / 10)
+    # frames between the thresholds keep the state of the last frame outside of them
+    decided = (power < low) | (power >= high)
+    last_decided = np.maximum.accumulate(np.where(decided, np.arange(num_frames), 0))
+    silent = decided[last_decided] & (power[last_decided] < low)
+    # runs of silent frames
+    edges = np.diff(np.concatenate([[0], silent.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    keep = (stops - starts) * frame_len >= rate * params['MIN_SILENCE_LEN'] / 1000
+    starts = (starts[keep] * frame_len / rate).tolist()
+    stops = (stops[keep] * frame_len / rate).tolist()
+    return [[start, stop] for start, stop in zip(starts, stops)]
+
+
+def plan_chunks(regions, max_len):
+    """
+    packs time regions into chunks of at most max_len seconds in total, cutting regions that do not fit
+    :param regions (list(list(float, float))): time regions in seconds
+    :param max_len (float): maximum total length of a chunk in seconds
     :return list(list(list(float, float))): chunks
     """
-    audio = AudioSegment.from_file(filepath,
-                                   params['INPUT_FORMAT'])
-    duration = audio.duration_seconds
+    processed_chunks = []
+    chunk = []
+    chunk_len = 0
+    for start, stop in regions:
+        while start < stop:
+            remaining = max_len - chunk_len
+            if stop - start < remaining:
+                chunk.append([start, stop])
+                chunk_len += stop - start
+                break
+            chunk.append([start, start + remaining])
+            processed_chunks.append(chunk)
+            chunk = []
+            chunk_len = 0
+            start += remaining
+    if len(chunk) != 0:
+        processed_chunks.append(chunk)
+    return processed_chunks
+
+
+def get_chunk_times_audio(audio):
+    """
+    splits audio into chunks
+    :param audio (np.ndarray): mono int16 samples at AUDIO_SAMPLE_RATE
+    :return list(list(list(float, float))): chunks
+    """
+    duration = len(audio) / params['AUDIO_SAMPLE_RATE']
     if duration > params['MIN_SPLIT_LEN']:
-        from pydub import silence
-        dBFS = audio.dBFS
-        silence_time = silence.detect_silence(audio, min_silence_len=params['MIN_SILENCE_LEN'],
-                                              silence_thresh=dBFS + params['SILENCE_THRESHOLD'])
-        silence_chunks = [[(start / 1000), (stop / 1000)] for start, stop in silence_time]  # ms to seconds
+        silence_chunks = detect_silence(audio)
         chunks_without_silence = []
         current_time = 0
         for start, stop in silence_chunks:
@@ -73,56 +169,151 @@ def get_chunk_times_audio(filepath):
             current_time = stop - params['SILENCE_BUFFER']
         if duration - current_time >= 1:
             chunks_without_silence.append([current_time, duration])
-        processed_chunks = []
-        current_chunk = 0
-        chunk_start = None
-        chunk = []
-        for start, stop in chunks_without_silence:
-            while stop - start != 0:
-                if chunk_start is None:
-                    chunk_start = start
-                if current_chunk + (stop - start) > params['MIN_SPLIT_LEN']:
-                    if len(chunk) == 0:
-                        processed_chunks.append(
-                            [[chunk_start, chunk_start + current_chunk + (params['MIN_SPLIT_LEN'] - current_chunk)]])
-                    else:
-                        chunk.append([chunk_start, chunk_start + (params['MIN_SPLIT_LEN'] - current_chunk)])
-                        processed_chunks.append(chunk)
-                        chunk = []
-                    start += (params['MIN_SPLIT_LEN'] - current_chunk)
-                    chunk_start = None
-                    current_chunk = 0
-                else:
-                    current_chunk += (stop - start)
-                    start = stop
-            if current_chunk != 0:
-                chunk.append([chunk_start, chunk_start + current_chunk])
-            chunk_start = None
-        if len(chunk) != 0:
-            processed_chunks.append(chunk)
+        processed_chunks = plan_chunks(chunks_without_silence, params['MIN_SPLIT_LEN'])
     else:
         processed_chunks = [[[0, duration]]]
     return processed_chunks
 
 
-def get_chunk_times_video(filepath):
+def probe_video(filepath):
     """
-    splits a video file into chunks
+    gets the duration and the keyframe times of a video file, the keyframes are probed once and cached
     :param filepath (str): filepath
-    :return list(list(list(float, float))): chunks
+    :return (float, list(float)): duration in seconds (None if unknown), sorted keyframe times in seconds (empty if
+    they cannot be probed)
     """
-    duration = float((ffmpeg.probe(filepath)['streams'][0]['duration']))
-    if duration > params['MIN_SPLIT_LEN']:
-        processed_chunks = []
-        current_time = 0
-        while current_time < duration:
-            end_time = current_time + params['MIN_SPLIT_LEN']
-            if end_time > duration:
-                end_time = duration
-            processed_chunks.append([[current_time, end_time]])
+    metadata = probe(filepath)
+    if metadata['keyframes'] is None:
+        try:
+            info = ffmpeg.probe(filepath, select_streams='v:0', skip_frame='nokey', show_entries='frame=pts_time')
+        except ffmpeg.Error:
+            info = dict()
+        frames = info.get('frames', [])
+        metadata['keyframes'] = sorted(float(frame['pts_time']) for frame in frames if 'pts_time' in frame)
+        # the cached metadata is replaced, never modified, as other threads may be reading it
+        stat = os.stat(filepath)
+        path = os.path.abspath(filepath)
+        with probe_lock:
+            if path in probe_cache and probe_cache[path][0] == (stat.st_mtime_ns, stat.st_size):
+                probe_cache[path] = (probe_cache[path][0], dict(metadata))
+    return metadata['duration'], metadata['keyframes']
+
+
+def video_chunk_bounds(duration, keyframes=None):
+    """
+    lazily splits video into windows of at most MIN_SPLIT_LEN
+    :param duration (float): duration in seconds
+    :param keyframes (list(float)): sorted keyframe times to snap the window ends to, None to cut at fixed intervals
+    :return generator((float, float)): window start and stop times
+    """
+    start = 0
+    while start < duration:
+        stop = min(start + params['MIN_SPLIT_LEN'], duration)
+        if keyframes is not None and stop < duration:
+            # the last keyframe inside the window, unless it would make the window too short
+            i = bisect.bisect_right(keyframes, stop) - 1
+            if i >= 0 and keyframes[i] - start >= params['MIN_SPLIT_LEN'] / 2:
+                stop = keyframes[i]
+        yield start, stop
+        start = stop
+
+
+def get_chunk_times_video(duration, keyframes=None):
+    """
+    splits video into chunks
+    :param duration (float): duration in seconds
+    :param keyframes (list(float)): sorted keyframe times to snap the chunk boundaries to
+    :return generator(list(list(float, float))): chunks
+    """
+    for start, stop in video_chunk_bounds(duration, keyframes):
+        yield [[start, stop]]
+
+
+def load_audio(filepath):
+    """
+    decodes the audio channel of a file to mono samples at AUDIO_SAMPLE_RATE
+    :param filepath (str): filepath
+    :return (np.ndarray): int16 samples
+    """
+    stream = ffmpeg.output(ffmpeg.input(filepath).audio,
+                           'pipe:',
+                           f='s16le',
+                           acodec='pcm_s16le',
+                           ac=params['AUDIO_CHANNELS'],
+                           ar=params['AUDIO_SAMPLE_RATE']
+                           )
+    out, _ = ffmpeg.run(stream, capture_stdout=True, quiet=True)
+    return np.frombuffer(out, np.int16)
+
+
+def load_video(filepath):
+    """
+    decodes the video channel of a file to grayscale mouth region frames
+    frames are scaled to VIDEO_WIDTH x VIDEO_HEIGHT at VIDEO_FPS (as in convert), then resized to 224x224 and
+    center-cropped to the model ROI size (as in the model preprocessing)
+    :param filepath (str): filepath
+    :return (np.ndarray): uint8 frames (frames, ROI size, ROI size)
+    """
+    roi_size = args['ROI_SIZE']
+    stream = ffmpeg.input(filepath).video
+    stream = ffmpeg.filter(stream, 'scale', width=params['VIDEO_WIDTH'], height=params['VIDEO_HEIGHT'])
+    stream = ffmpeg.filter(stream, 'fps', fps=params['VIDEO_FPS'], round='up')
+    stream = ffmpeg.filter(stream, 'format', 'gray')
+    stream = ffmpeg.filter(stream, 'scale', width=224, height=224, flags='bilinear')
+    stream = ffmpeg.filter(stream, 'crop', roi_size, roi_size)
+    stream = ffmpeg.output(stream, 'pipe:', f='rawvideo', pix_fmt='gray')
+    out, _ = ffmpeg.run(stream, capture_stdout=True, quiet=True)
+    return np.frombuffer(out, np.uint8).reshape(-1, roi_size, roi_size)
+
+
+def load_media(filepath, mode):
+    """
+    decodes a file once into the data needed by the prediction mode
+    :param filepath (str): filepath
+    :param mode (str): prediction mode
+    :return (dict(str:np.ndarray or float)): audio samples (None if absent), video frames (None if absent or not
+    needed), duration in seconds
+    :raises ValueError: if the file has none of the channels the mode can transcribe
+    """
+    check_audio, check_video = check_streams(filepath)
+    media = {'audio': None, 'video': None}
+    if check_audio:
+        media['audio'] = load_audio(filepath)
+    if check_video and mode != 'audio-only':
+        media['video'] = load_video(filepath)
+    if media['audio'] is not None:
+        media['duration'] = len(media['audio']) / params['AUDIO_SAMPLE_RATE']
+    elif media['video'] is not None:
+        media['duration'] = len(media['video']) / params['VIDEO_FPS']
     else:
-        processed_chunks = [[[0, duration]]]
-    return processed_chunks
+        channels = 'audio' if mode == 'audio-only' else 'audio or video'
+        raise ValueError(f'{filepath} has no {channels} channel to transcribe')
+    return media
+
+
+def split_media(media, processed_chunks):
+    """
+    cuts decoded media into chunks
+    :param media (dict(str:np.ndarray or float)): decoded media (load_media output)
+    :param processed_chunks (list(list(list(float, float)))): chunk times
+    :return list(dict(str:tuple or np.ndarray or list)): chunks - audio as (sample rate, samples), video frames and
+    chunk times
+    """
+    outputs = []
+    for chunk in processed_chunks:
+        if np.sum([i[1] - i[0] for i in chunk]) < 1:
+            continue
+        output = {'audio': None, 'video': None, 'times': [[float(start), float(stop)] for start, stop in chunk]}
+        if media['audio'] is not None:
+            rate = params['AUDIO_SAMPLE_RATE']
+            pieces = [media['audio'][int(round(start * rate)):int(round(stop * rate))] for start, stop in chunk]
+            output['audio'] = (rate, np.concatenate(pieces))
+        if media['video'] is not None:
+            rate = params['VIDEO_FPS']
+            pieces = [media['video'][int(round(start * rate)):int(round(stop * rate))] for start, stop in chunk]
+            output['video'] = np.concatenate(pieces)
+        outputs.append(output)
+    return outputs
 
 
 def split(filepath, overwrite=False):
@@ -134,9 +325,13 @@ def split(filepath, overwrite=False):
     """
     check_audio, check_video = check_streams(filepath)
     if not check_audio:
-        processed_chunks = get_chunk_times_video(filepath)
+        duration, keyframes = probe_video(filepath)
+        if duration is None:
+            # the container does not store the duration, it is taken from the decoded frames
+            duration = len(load_video(filepath)) / params['VIDEO_FPS']
+        processed_chunks = get_chunk_times_video(duration, keyframes)
     else:
-        processed_chunks = get_chunk_times_audio(filepath)
+        processed_chunks = get_chunk_times_audio(load_audio(filepath))
     outputs = []
     for i, chunk in enumerate(processed_chunks):
         stream = None
@@ -256,22 +451,134 @@ def get_audio(filepath, output):
     ffmpeg.run(stream, overwrite_output=True, quiet=True)
 
 
-def predict(files, mode):
+def predict(files, mode, config=None, progress=None):
     """
     driver function for model prediction
     :param files (list(str)): filepaths
     :param mode (str): prediction mode
+    :param config (InferenceConfig): model configuration, mode defaults if None
+    :param progress (callable): called with (filepath, partial transcript, decoded chunks, chunks) as chunks are decoded
     :return (dict(str:str)): prediction result
     """
     if mode == 'audio-only':
-        pred = pred_audio_only(files)
+        pred = pred_audio_only(files, config, progress=progress)
     elif mode == 'video-only':
-        pred = pred_video_only(files)
+        pred = pred_video_only(files, config, progress=progress)
     else:
-        pred = pred_audio_video(files)
+        pred = pred_audio_video(files, config, progress=progress)
     return pred
 
 
+def get_inference_config(mode, settings=None):
+    """
+    builds the model configuration from the application settings
+    :param mode (str): prediction mode
+    :param settings (dict(str:str)): application settings, read from config.txt if None
+    :return (InferenceConfig): model configuration
+    """
+    if settings is None:
+        settings = get_from_file('config.txt', '')
+    return InferenceConfig.from_settings(mode, settings)
+
+
+def get_live_transcriber(settings=None):
+    """
+    creates the transcriber of a recording in progress, it uses the audio-only model
+    :param settings (dict(str:str)): application settings, read from config.txt if None
+    :return (LiveTranscriber): transcriber
+    """
+    return live_transcriber(get_inference_config('audio-only', settings))
+
+
+def get_cache():
+    """
+    gets the artifact cache with the size limit from the application settings
+    :return (ArtifactCache): cache
+    """
+    settings = get_from_file('config.txt', 'Cache size')
+    if 'Cache size' in settings:
+        cache.max_size = int(settings['Cache size']) * 2 ** 20
+    return cache
+
+
+def get_model_stats():
+    """
+    gets the load statistics of the models loaded by the predictions
+    :return (dict(str:dict)): model name - {path, device, load time in seconds, resident memory in bytes}
+    """
+    return registry.stats()
+
+
+def get_transcript_key(filepath, config):
+    """
+    builds the cache key of a file transcription
+    :param filepath (str): filepath
+    :param config (InferenceConfig): model configuration
+    :return (str): key
+    """
+    checkpoints = [cache.file_hash(file) if os.path.exists(file) else file for file in config.checkpoint_files()]
+    return cache.key('transcript', cache.file_hash(filepath), config.key(), checkpoints)
+
+
+def get_chunk_times_key(filepath, mode):
+    """
+    builds the cache key of the chunk times of a file
+    :param filepath (str): filepath
+    :param mode (str): prediction mode
+    :return (str): key
+    """
+    return cache.key('chunk-times', cache.file_hash(filepath), mode, sorted(params.items()))
+
+
+def get_log_probs_keys(filepath, chunk_times, config):
+    """
+    builds the cache keys of the log probabilities of the chunks of a file, a chunk is identified by the file content
+    and its times, so the keys are known without decoding the file
+    :param filepath (str): filepath
+    :param chunk_times (list(list(list(float, float)))): times of every chunk
+    :param config (InferenceConfig): model configuration
+    :return (list(str)): keys
+    """
+    file_hash = cache.file_hash(filepath)
+    model_key = config.model_key()
+    noise = (config.args['SEED'], params['NOISE_SEED'], config.video_snr if config.mode != 'audio-only' else None)
+    return [cache.key('log-probs', model_key, noise, file_hash, times) for times in chunk_times]
+
+
+def set_chunk_keys(filepath, chunks, config):
+    """
+    sets the log probabilities keys of the chunks of a file and caches the chunk times of the file
+    :param filepath (str): filepath
+    :param chunks (list(dict)): chunks (split_media output)
+    :param config (InferenceConfig): model configuration
+    :return (void):
+    """
+    chunk_times = [chunk['times'] for chunk in chunks]
+    cache.put(get_chunk_times_key(filepath, config.mode), chunk_times)
+    for chunk, key in zip(chunks, get_log_probs_keys(filepath, chunk_times, config)):
+        chunk['key'] = key
+
+
+def get_cached_chunks(filepath, config):
+    """
+    gets the chunks of a file from the cache without decoding it, when its chunk times and the log probabilities of
+    all its chunks are cached, so that only the decoding of the log probabilities runs again
+    :param filepath (str): filepath
+    :param config (InferenceConfig): model configuration
+    :return (list(dict)): chunks with their times, log probabilities key and log probabilities, None if not cached
+    """
+    chunk_times = cache.get(get_chunk_times_key(filepath, config.mode))
+    if chunk_times is None:
+        return None
+    chunks = []
+    for times, key in zip(chunk_times, get_log_probs_keys(filepath, chunk_times, config)):
+        log_probs = cache.get_array(key, mmap=True)
+        if log_probs is None:
+            return None
+        chunks.append({'times': times, 'key': key, 'log_probs': log_probs})
+    return chunks
+
+
 def compute_wer(original, pred):
     """
     driver function for WER computing
@@ -300,86 +607,103 @@ def get_tensor_batch(data):
     return batch
 
 
-def process_convert(files, mode, SNR=100):
+def preprocess_file(filepath, mode, SNR=100):
     """
-    driver for processing and converting of files
-    :param files (list(str)): filepaths
+    decodes a file, adds noise to its video and splits it into chunks
+    (module-level so that it can run in a preprocessing worker process)
+    :param filepath (str): filepath
     :param mode (str): convertion mode
     :param SNR (float): SNR in dB
-    :return (dict(str:list(str)): convertion result
+    :return (list(dict)): chunks (split_media output)
     """
-    result = dict()
-    for file in files:
-        result[file] = []
-        temp = file
-        if mode == 'video-only' or mode == 'audio-video':
-            temp = add_video_noise(file, SNR)
-        output = split(temp)
-        for i in output:
-            result[file].append(convert(i, mode))
-    return result
+    media = load_media(filepath, mode)
+    if media['video'] is not None:
+        media['video'] = add_noise(media['video'], SNR, params['NOISE_SEED'])
+    if media['audio'] is not None:
+        processed_chunks = get_chunk_times_audio(media['audio'])
+    else:
+        # the duration of the decoded frames is always known, the keyframes only if the file can be probed for them
+        processed_chunks = get_chunk_times_video(media['duration'], probe_video(filepath)[1])
+    return split_media(media, processed_chunks)
 
 
-def add_noise(signal, SNR):
+def add_noise(frames, SNR, seed=None):
     """
-    adds noise to video data
-    :param signal (np.ndarray): original signal
+    adds half-rectified gaussian noise to video frames, using saturating uint8 arithmetic
+    frames are processed in blocks so the noise buffer stays small
+    :param frames (np.ndarray): uint8 frames
     :param SNR (float): SNR in dB
-    :return (np.ndarray): resulting output
+    :param seed (int): random seed
+    :return (np.ndarray): noisy frames
     """
     if SNR >= 100:
-        return signal
-    noise = np.ndarray(signal.shape, np.uint8)
-    channel_num = 1 if len(signal.shape) == 2 else len(signal.shape)
-    a = tuple((0 for i in range(channel_num)))
-    b = tuple((255 * ((100 - SNR) / 100) for i in range(channel_num)))
-    cv.randn(noise, a, b)
-    return signal + noise
+        return frames
+    std = 255 * ((100 - SNR) / 100)
+    rng = np.random.default_rng(seed)
+    output = np.empty_like(frames)
+    block = params['NOISE_BLOCK_SIZE']
+    noise_block = np.empty((min(block, len(frames)),) + frames.shape[1:], dtype=np.float32)
+    for i in range(0, len(frames), block):
+        frame_block = frames[i:i + block]
+        noise = noise_block[:len(frame_block)]
+        rng.standard_normal(dtype=np.float32, out=noise)
+        noise *= std
+        np.clip(noise, 0, 255, out=noise)
+        np.rint(noise, out=noise)
+        output[i:i + block] = frame_block + np.minimum(noise.astype(np.uint8), 255 - frame_block)
+    return output
 
 
-def add_video_noise(filepath, SNR):
-    """
-    video noise driver
-    :param filepath (str): filepath
-    :param SNR (float): SNR in dB
-    :return (str): output filepath
-    """
-    if SNR >= 100:
-        return filepath
-    output = filepath.split('.')
-    output[-2] += '_noisy_' + str(SNR)
-    output = '.'.join(output).split('\\')[-1]
-    output = 'temp/' + output
-    output = os.path.abspath(output)
-    check_audio, check_video = check_streams(filepath)
-    if check_audio:
-        get_audio(filepath, 'temp/temp_audio.mp4')
-    cam = cv.VideoCapture(filepath)
-    fps = cam.get(cv.CAP_PROP_FPS)
-    recorder = cv.VideoWriter('temp/temp_video.mp4', cv.VideoWriter_fourcc('m', 'p', '4', 'v'), fps,
-                              (int(cam.get(3)), int(cam.get(4))))
-    pos_frame = cam.get(cv.CAP_PROP_POS_FRAMES)
-    while True:
-        ret, frame = cam.read()
-        if ret:
-            noisy_frame = add_noise(frame, SNR)
-            recorder.write(noisy_frame)
-            pos_frame = cam.get(cv.CAP_PROP_POS_FRAMES)
-        else:
-            if cam.get(cv.CAP_PROP_POS_FRAMES) == cam.get(cv.CAP_PROP_FRAME_COUNT):
-                # If the number of captured frames is equal to the total number of frames,
-                # we stop
-                break
-            else:
-                cam.set(cv.CAP_PROP_POS_FRAMES, pos_frame - 1)
-                cv.waitKey(100)
-    cam.release()
-    recorder.release()
-    if check_audio:
-        merge('temp/temp_video.mp4', 'temp/temp_audio.mp4', output)
-    else:
-        shutil.copyfile('temp/temp_video.mp4', output)
-    return output
+class SampleRingBuffer:
+    """
+    fixed-size preallocated buffer of the latest samples of a stream
+    a single thread writes, readers get views of the buffer instead of copies: a view stays valid until its samples
+    are overwritten, i.e. while less than capacity samples have been written after them
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        """
+        :param capacity (int): number of samples kept
+        :param dtype (np.dtype): sample type
+        """
+        self.buffer = np.zeros(capacity, dtype=dtype)
+        self.capacity = capacity
+        # number of samples written since the start, the position of the next sample in the stream
+        self.total = 0
+
+    def write(self, samples):
+        """
+        appends samples, overwriting the oldest ones
+        :param samples (np.ndarray): samples
+        :return (void):
+        """
+        total = self.total + len(samples)
+        samples = samples[-self.capacity:]
+        start = (total - len(samples)) % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self.buffer[start:start + first] = samples[:first]
+        self.buffer[:len(samples) - first] = samples[first:]
+        self.total = total
+
+    def read(self, start, stop=None):
+        """
+        gets samples by their position in the stream
+        :param start (int): position of the first sample
+        :param stop (int): position after the last sample, the latest written position if None
+        :return (tuple(np.ndarray)): views of the samples - two if they wrap around the end of the buffer, None if
+        the samples have already been overwritten
+        """
+        total = self.total
+        stop = total if stop is None else min(stop, total)
+        if start < total - self.capacity:
+            return None
+        if start >= stop:
+            return self.buffer[:0],
+        begin = start % self.capacity
+        end = begin + stop - start
+        if end <= self.capacity:
+            return self.buffer[begin:end],
+        return self.buffer[begin:], self.buffer[:end - self.capacity]
 
 
 def generate_audio_noise(dir_path):
@@ -457,46 +781,6 @@ def change_file(file, param, param_val):
     return status
 
 
-def change_config_file(mode, param, param_val):
-    """
-    changes the value of the specified parameter in the provided file to the desired
-    :param mode (str): a string indicating the file type
-    :param param (str): file parameter
-    :param param_val (str): desired parameter value
-    :return (bool): whether a change has been made
-    """
-    status = False
-    if mode == 'audio-only':
-        file = 'other/deep_avsr/audio_only/config.py'
-    elif mode == 'video-only':
-        file = 'other/deep_avsr/video_only/config.py'
-    else:
-        file = 'other/deep_avsr/audio_visual/config.py'
-    search_string_1 = f"args['{param}']"
-    search_string_2 = f'args["{param}"]'
-    new_file_content = None
-    with open(file) as f:
-        file_content = f.readlines()
-        new_lines = []
-        for line in file_content:
-            if search_string_1 in line or search_string_2 in line:
-                status = True
-                search_string = search_string_1
-                comment_pos = line.find('#')
-                comment_str = ''
-                if comment_pos != -1:
-                    comment_str = line[comment_pos:]
-                if type(param_val) == str:
-                    param_val = f"'{param_val}'"
-                line = search_string + f' = {param_val}  {comment_str}'
-            new_lines.append(line)
-        new_file_content = ''.join(new_lines)
-    if new_file_content is not None:
-        with open(file, 'w') as f:
-            f.write(new_file_content)
-    return status
-
-
 def main():
     parser = ArgumentParser()
     parser.add_argument('path', type=str, help='file absolute path')
@@ -508,6 +792,4 @@ def main():
 
 
 if __name__ == '__main__':
-    print(change_config_file('audio-only', 'NOISE_SNR_DB', 10))
-    print(change_config_file('audio-only', 'NOISE_SNR_DB', 20))
-    print('done')
+    main()